@@ -0,0 +1,65 @@
+"""
+预写日志每条消息的写入开销：追加+确认一条通知，对比批量fsync与每条fsync
+
+用法：python benchmarks/bench_journal.py [--number 20000] [--dir /tmp/qqmsg-journal]
+"""
+import argparse
+import importlib.util
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_journal():
+    path = ROOT / "plugins" / "qqmsg" / "delivery" / "journal.py"
+    spec = importlib.util.spec_from_file_location("qqmsg_journal", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run(journal_cls, path: Path, number: int, sync_interval: float, ack: bool) -> dict:
+    shutil.rmtree(path, ignore_errors=True)
+    journal = journal_cls(path, sync_interval=sync_interval)
+    journal.open()
+    item = {"title": "《三体》 S01E05 已入库", "text": "质量：1080p WEB-DL\n大小：1.2GB\n站点：馒头",
+            "image": "https://image.tmdb.org/t/p/w500/poster.jpg", "user": "Anjoy", "priority": 1,
+            "send_type": "send_group_msg", "number": "123456789", "mtype": "Organize"}
+    start = time.perf_counter()
+    for _ in range(number):
+        key = journal.append(item)
+        if ack:
+            journal.ack([key])
+    elapsed = time.perf_counter() - start
+    journal.close()
+    stats = journal.stats()
+    shutil.rmtree(path, ignore_errors=True)
+    return {"us": elapsed / number * 1e6, "syncs": stats["syncs"], "rotations": stats["rotations"]}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--dir", default=None, help="日志目录，默认系统临时目录（测fsync请指定实际磁盘）")
+    args = parser.parse_args()
+    journal = load_journal()
+    base = Path(args.dir or tempfile.mkdtemp(prefix="qqmsg-journal-"))
+
+    print(f"{'case':<26}{'us/msg':>10}{'fsyncs':>9}{'rotations':>11}")
+    cases = [
+        ("append/batch 200ms", 0.2, False, args.number),
+        ("append+ack/batch 200ms", 0.2, True, args.number),
+        # 每条fsync很慢，只跑少量
+        ("append+ack/fsync each", 0, True, min(args.number, 2000)),
+    ]
+    for name, sync_interval, ack, number in cases:
+        result = run(journal.Journal, base / "journal", number, sync_interval, ack)
+        print(f"{name:<26}{result['us']:>10.2f}{result['syncs']:>9}{result['rotations']:>11}")
+    shutil.rmtree(base, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+QQModule.message_parser 解析开销对比：旧实现（两次json.loads并记录整条消息）与 qq.inbound.parse_inbound
+
+用法：python benchmarks/bench_parse.py [--number 20000]
+"""
+import argparse
+import importlib.util
+import io
+import json
+import logging
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_inbound():
+    path = ROOT / "plugins" / "qqmsg" / "qq" / "inbound.py"
+    spec = importlib.util.spec_from_file_location("qqmsg_inbound", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_logger() -> logging.Logger:
+    log = logging.getLogger("bench_parse")
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    log.addHandler(logging.StreamHandler(io.StringIO()))
+    return log
+
+
+def make_bodies():
+    text = json.dumps({
+        "is_qq": True,
+        "message": {
+            "message_id": 1024,
+            "user_id": 123456,
+            "group_id": 654321,
+            "username": "tester",
+            "date": 1700000000,
+            "text": "流浪地球2"
+        }
+    }, ensure_ascii=False).encode("utf-8")
+    other = json.dumps({"is_qq": False, "message": {"text": "hello"}}).encode("utf-8")
+    image = json.dumps({"is_qq": True, "message": {"message_id": 1, "user_id": 1, "text": ""}}).encode("utf-8")
+    return {"text": text, "not_qq": other, "no_text": image}
+
+
+def legacy_parse(body, log):
+    message = json.loads(body).get('message')
+    is_qq = json.loads(body).get('is_qq')
+    log.info(message)
+    if not is_qq:
+        return None
+    if message:
+        text = message.get("text")
+        if text:
+            log.info(f"收到QQ消息：userid={message.get('user_id')}, groupid={message.get('group_id')}, "
+                     f"username={message.get('username')}, text={text}")
+            return message
+    return None
+
+
+def new_parse(body, log, parse_inbound):
+    message = parse_inbound(body)
+    if not message:
+        return None
+    log.info(f"收到QQ消息：userid={message.user_id}, groupid={message.group_id}, "
+             f"username={message.username}, text={message.text}")
+    return message
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    inbound = load_inbound()
+    log = make_logger()
+    backend = getattr(inbound.loads, "__module__", "json")
+    print(f"JSON后端：{backend}，每组 {args.number} 次")
+    print(f"{'payload':<10}{'legacy us/msg':>16}{'new us/msg':>14}{'speedup':>10}")
+    for name, body in make_bodies().items():
+        old = timeit.timeit(lambda: legacy_parse(body, log), number=args.number)
+        new = timeit.timeit(lambda: new_parse(body, log, inbound.parse_inbound), number=args.number)
+        print(f"{name:<10}{old / args.number * 1e6:>16.2f}{new / args.number * 1e6:>14.2f}{old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+每条消息的请求体编码开销：旧实现（合并字典后urlencode / json.dumps）与 delivery.payload.PayloadBuilder
+OneBot请求体已改为JSON消息段，大小与旧的表单不可直接比较，只比较编码耗时
+
+用法：python benchmarks/bench_payload.py [--number 50000]
+"""
+import argparse
+import gzip
+import importlib.util
+import json
+import timeit
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_payload():
+    path = ROOT / "plugins" / "qqmsg" / "delivery" / "payload.py"
+    spec = importlib.util.spec_from_file_location("qqmsg_payload", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_onebot(number, title, content):
+    req_json = {"user_id": number, "group_id": number}
+    return urlencode({**req_json, **{"message": f"#{title}\n{content}"}})
+
+
+def legacy_fastapi(number, user, title, image, content):
+    req_json = {"user_id": number, "group_id": number}
+    data = {"user": user, "title": title, "image": image, "text": content}
+    return json.dumps({**req_json, **data}, ensure_ascii=False).encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=50000)
+    args = parser.parse_args()
+    payload = load_payload()
+
+    number, user, image = "123456789", "Anjoy", "https://image.tmdb.org/t/p/w500/poster.jpg"
+    short = ("《三体》 S01E05 已入库", "质量：1080p WEB-DL\n大小：1.2GB\n站点：馒头")
+    long = ("搜索结果", "\n".join(f"{i}.【站点{i % 7}】[S01E{i % 30 + 1:02d} WEB-DL 1080p H264 HHWEB]"
+                                  f"(https://example.org/details.php?id={i}) 1.2GB 免费 {i}↑" for i in range(20)))
+    onebot = payload.PayloadBuilder(url="http://bot/send_group_msg", send_type="send_group_msg",
+                                    number=number, token="secret")
+    fastapi = payload.PayloadBuilder(url="http://bot/send_fastapi_msg", send_type="send_fastapi_msg",
+                                     number=number, token="secret")
+    fastapi_gzip = payload.PayloadBuilder(url="http://bot/send_fastapi_msg", send_type="send_fastapi_msg",
+                                          number=number, token="secret", gzip_min=1024)
+
+    print(f"{'case':<22}{'legacy us':>11}{'builder us':>12}{'speedup':>9}{'legacy B':>10}{'builder B':>11}")
+    for name, (title, content) in (("short", short), ("list", long)):
+        cases = [
+            (f"onebot/{name}",
+             lambda: legacy_onebot(number, title, content),
+             lambda: onebot.onebot([{"type": "text", "data": {"text": f"#{title}\n{content}"}}])),
+            (f"fastapi/{name}",
+             lambda: legacy_fastapi(number, user, title, image, content),
+             lambda: fastapi.fastapi_body(user=user, title=title, image=image, text=content)),
+            (f"fastapi+gzip/{name}",
+             lambda: legacy_fastapi(number, user, title, image, content),
+             lambda: fastapi_gzip.fastapi_body(user=user, title=title, image=image, text=content)),
+        ]
+        for case, legacy, builder in cases:
+            legacy_us = timeit.timeit(legacy, number=args.number) / args.number * 1e6
+            builder_us = timeit.timeit(builder, number=args.number) / args.number * 1e6
+            legacy_size = len(legacy())
+            body = builder()[1]
+            if isinstance(body, bytes) and body[:2] == b"\x1f\x8b":
+                # 校验压缩后内容一致
+                assert json.loads(gzip.decompress(body)) == json.loads(legacy())
+            elif case.startswith("onebot"):
+                assert json.loads(body)["message"][0]["data"]["text"] == f"#{title}\n{content}"
+            else:
+                assert json.loads(body) == json.loads(legacy())
+            print(f"{case:<22}{legacy_us:>11.2f}{builder_us:>12.2f}{legacy_us / builder_us:>8.1f}x"
+                  f"{legacy_size:>10}{len(body):>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+QQ.send_torrents_msg 列表渲染开销：旧实现（逐条MetaInfo + 字符串反复拼接，全部渲染后才能发送）
+与当前实现 paginate(header, torrent_lines(...))（惰性渲染，首页渲染完即可发送）的首页延迟和全部分页耗时
+
+需在MoviePilot环境中运行（依赖app.core.metainfo），插件目录位于 app/plugins/qqmsg：
+    cd /path/to/MoviePilot && python /path/to/benchmarks/bench_render.py
+"""
+import re
+import time
+from types import SimpleNamespace
+
+from app.core.metainfo import MetaInfo
+from app.plugins.qqmsg.qq import render
+from app.utils.string import StringUtils
+
+TITLES = [
+    "The.Wandering.Earth.II.2023.2160p.WEB-DL.H265.DDP5.1-ADWeb",
+    "Three-Body.S01E{ep:02d}.2023.1080p.WEB-DL.H264.AAC-HHWEB",
+    "Oppenheimer.2023.1080p.BluRay.x264.DTS-HD.MA.5.1-FGT",
+    "Dune.Part.Two.2024.2160p.UHD.BluRay.REMUX.HDR.HEVC.TrueHD.7.1.Atmos-FraMeSToR",
+]
+
+
+def make_torrents(count: int):
+    torrents = []
+    for i in range(count):
+        title = TITLES[i % len(TITLES)].format(ep=i % 30 + 1) + f".v{i}"
+        torrent = SimpleNamespace(site_name=f"site{i % 7}", title=title, description="中字 特效",
+                                  page_url=f"https://example.org/details.php?id={i}",
+                                  size=1024 ** 3 * (i % 50 + 1), volume_factor="免费", seeders=i % 300)
+        torrents.append(SimpleNamespace(torrent_info=torrent))
+    return torrents
+
+
+def legacy_caption(title, torrents):
+    index, caption = 1, "*%s*" % title
+    for context in torrents:
+        torrent = context.torrent_info
+        meta = MetaInfo(torrent.title, torrent.description)
+        name = f"{meta.season_episode} {meta.resource_term} {meta.video_term} {meta.release_group}"
+        name = re.sub(r"\s+", " ", name).strip()
+        caption = f"{caption}\n{index}.【{torrent.site_name}】[{name}]({torrent.page_url}) " \
+                  f"{StringUtils.str_filesize(torrent.size)} {torrent.volume_factor} {torrent.seeders}↑"
+        index += 1
+    return caption
+
+
+def measure(func, *args) -> float:
+    start = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def first_page(header, torrents) -> str:
+    return next(render.paginate(header, render.torrent_lines(torrents)))[0]
+
+
+def all_pages(header, torrents) -> list:
+    return [page for page, _ in render.paginate(header, render.torrent_lines(torrents))]
+
+
+def main():
+    print(f"{'count':>6}{'legacy ms':>12}{'first cold ms':>16}{'first warm ms':>16}{'all pages ms':>15}")
+    for count in (10, 100, 1000):
+        torrents = make_torrents(count)
+        header = "*搜索结果*"
+        render.torrent_label.cache_clear()
+        legacy = measure(legacy_caption, "搜索结果", torrents)
+        render.torrent_label.cache_clear()
+        cold = measure(first_page, header, torrents)
+        warm = measure(first_page, header, torrents)
+        pages = measure(all_pages, header, torrents)
+        # 分页后的列表行与旧实现逐行一致
+        lines = [line for page in all_pages(header, torrents) for line in page.split("\n")[1:]]
+        assert legacy_caption("搜索结果", torrents).split("\n")[1:] == lines
+        print(f"{count:>6}{legacy:>12.1f}{cold:>16.1f}{warm:>16.1f}{pages:>15.1f}")
+    print(render.torrent_label.cache_info())
+
+
+if __name__ == "__main__":
+    main()
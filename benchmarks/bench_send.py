@@ -0,0 +1,271 @@
+"""
+发送链路基准测试：启动本地模拟bot（stub_bot.py），按指定速率驱动
+QqMsg.send（OneBot与fastapi两种方式）以及 QQ.send_msg / send_meidas_msg / send_torrents_msg，
+输出吞吐、延迟分位数和内存占用，可保存结果并与基线对比，退化超出容忍度时返回非0
+
+需在MoviePilot环境中运行，插件目录位于 app/plugins/qqmsg：
+    cd /path/to/MoviePilot && python /path/to/benchmarks/bench_send.py --count 2000 --rate 200 --latency 20
+    python /path/to/benchmarks/bench_send.py --save base.json
+    python /path/to/benchmarks/bench_send.py --compare base.json --tolerance 0.2
+"""
+import argparse
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stub_bot import StubBot
+
+from app.core.event import Event
+from app.plugins.qqmsg import QqMsg
+from app.plugins.qqmsg.delivery import Transport
+from app.plugins.qqmsg.qq.qq import QQ
+from app.schemas.types import EventType, NotificationType
+
+SCENARIOS = ("plugin_onebot", "plugin_fastapi", "qq_send_msg", "qq_medias", "qq_torrents")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def pace(count: int, rate: float, func: Callable[[int], None]):
+    """
+    按固定速率调用，rate为0时不限速
+    """
+    interval = 1 / rate if rate else 0
+    start = time.perf_counter()
+    for i in range(count):
+        if interval:
+            delay = start + i * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        func(i)
+
+
+class Arrivals:
+    """
+    记录每条消息到达模拟bot的时间，用于计算端到端延迟
+    """
+
+    def __init__(self):
+        self.sent: Dict[str, float] = {}
+        self.arrived: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def on_request(self, action: str, payload: dict, arrived: float):
+        title = payload.get("title") or self.__message_title(payload.get("message"))
+        if title.startswith("bench-"):
+            with self._lock:
+                self.arrived[title] = arrived
+
+    @staticmethod
+    def __message_title(message: Any) -> str:
+        """
+        OneBot消息的第一行文本，消息可以是字符串或消息段数组
+        """
+        if isinstance(message, list):
+            message = "".join(segment.get("data", {}).get("text", "") for segment in message
+                              if isinstance(segment, dict) and segment.get("type") == "text")
+        return (message or "").lstrip().lstrip("#").split("\n", 1)[0]
+
+    def latencies(self, prefix: str) -> List[float]:
+        return [(self.arrived[key] - sent) * 1000 for key, sent in self.sent.items()
+                if key.startswith(prefix) and key in self.arrived]
+
+
+def make_medias(count: int):
+    return [SimpleNamespace(title_year=f"影片{i} (2024)", detail_link=f"https://example.org/movie/{i}",
+                            type=SimpleNamespace(value="电影"), vote_average=7.5,
+                            get_message_image=lambda: "") for i in range(count)]
+
+
+def make_torrents(count: int):
+    media = SimpleNamespace(get_message_image=lambda: "")
+    return [SimpleNamespace(media_info=media,
+                            torrent_info=SimpleNamespace(site_name=f"site{i % 7}",
+                                                         title=f"Three-Body.S01E{i % 30 + 1:02d}.2023.1080p.WEB-DL.H264.AAC-HHWEB",
+                                                         description="中字", page_url=f"https://example.org/{i}",
+                                                         size=1024 ** 3 * (i % 50 + 1), volume_factor="免费",
+                                                         seeders=i % 300))
+            for i in range(count)]
+
+
+def run_plugin(args, bot: StubBot, arrivals: Arrivals, send_type: str) -> dict:
+    plugin = QqMsg()
+    plugin.init_plugin({
+        "enabled": True,
+        "token": "bench",
+        "send_type": send_type,
+        "msg_url": bot.url,
+        "qq_number": "10001",
+        "queue_size": max(args.count, 1000),
+        "queue_workers": args.concurrency,
+        "pool_size": args.concurrency,
+        "max_concurrency": args.max_concurrency,
+        "max_retries": 0,
+    })
+    metrics = plugin._transport.metrics
+    metrics.reset()
+
+    def send(i: int):
+        key = f"bench-{send_type}-{i}"
+        arrivals.sent[key] = time.perf_counter()
+        plugin.send(Event(EventType.NoticeMessage, {
+            "type": NotificationType.Download,
+            "title": key,
+            "text": "基准测试消息内容",
+        }))
+
+    start = time.perf_counter()
+    pace(args.count, args.rate, send)
+    deadline = time.time() + args.timeout
+    while time.time() < deadline:
+        done = sum(metrics.count(name) for name in ("sent", "failed", "dropped", "held"))
+        if done >= args.count:
+            break
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    plugin.stop_service()
+    latencies = arrivals.latencies(f"bench-{send_type}-")
+    return {
+        "elapsed": elapsed,
+        "ok": metrics.count("sent"),
+        "failed": metrics.count("failed") + metrics.count("dropped") + metrics.count("held"),
+        "latencies": latencies,
+    }
+
+
+def run_qq(args, bot: StubBot, scenario: str) -> dict:
+    # QQ是单例，构造参数只在首次创建时生效，显式configure使每个场景都使用本次的连接池和并发上限
+    transport = Transport(pool_size=args.concurrency, max_concurrency=args.max_concurrency)
+    qq = QQ(num="10001", url=f"{bot.url}/send_fastapi_msg", transport=transport)
+    qq.configure(num="10001", url=f"{bot.url}/send_fastapi_msg", transport=transport)
+    medias, torrents = make_medias(args.items), make_torrents(args.items)
+    calls = {
+        "qq_send_msg": lambda i: qq.send_msg(title=f"bench-{i}", text="基准测试消息内容", userid="20002"),
+        "qq_medias": lambda i: qq.send_meidas_msg(medias=medias, title=f"bench-{i}", userid="20002"),
+        "qq_torrents": lambda i: qq.send_torrents_msg(torrents=torrents, title=f"bench-{i}", userid="20002"),
+    }
+    call = calls[scenario]
+    latencies, results = [], []
+    lock = threading.Lock()
+
+    def timed(i: int):
+        begin = time.perf_counter()
+        state = call(i)
+        with lock:
+            latencies.append((time.perf_counter() - begin) * 1000)
+            results.append(bool(state))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        pace(args.count, args.rate, lambda i: pool.submit(timed, i))
+    elapsed = time.perf_counter() - start
+    transport.close()
+    return {
+        "elapsed": elapsed,
+        "ok": sum(results),
+        "failed": len(results) - sum(results),
+        "latencies": latencies,
+    }
+
+
+def run(args) -> Dict[str, dict]:
+    arrivals = Arrivals()
+    bot = StubBot(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                  reject_rate=args.reject_rate, on_request=arrivals.on_request).start()
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            if args.memory:
+                tracemalloc.start()
+            if scenario == "plugin_onebot":
+                result = run_plugin(args, bot, arrivals, "send_group_msg")
+            elif scenario == "plugin_fastapi":
+                result = run_plugin(args, bot, arrivals, "send_fastapi_msg")
+            else:
+                result = run_qq(args, bot, scenario)
+            peak = 0
+            if args.memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            latencies = result.pop("latencies")
+            results[scenario] = {
+                **result,
+                "throughput": round(result["ok"] / result["elapsed"], 1) if result["elapsed"] else 0,
+                "p50": round(percentile(latencies, 0.5), 1),
+                "p95": round(percentile(latencies, 0.95), 1),
+                "p99": round(percentile(latencies, 0.99), 1),
+                "peak_kb": peak // 1024,
+                "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            }
+    finally:
+        bot.stop()
+    return results
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    吞吐下降或p99上升超过容忍度即视为退化
+    """
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        if base["throughput"] and result["throughput"] < base["throughput"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {base['throughput']} -> {result['throughput']}")
+        if base["p99"] and result["p99"] > base["p99"] * (1 + tolerance):
+            regressions.append(f"{scenario}: p99 {base['p99']}ms -> {result['p99']}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000, help="每个场景发送条数")
+    parser.add_argument("--rate", type=float, default=0, help="每秒发送条数，0为不限速")
+    parser.add_argument("--concurrency", type=int, default=4, help="工作线程数/连接池大小")
+    parser.add_argument("--max-concurrency", type=int, default=20, help="自适应并发上限的最大值，0为不限制")
+    parser.add_argument("--items", type=int, default=50, help="列表消息的条目数")
+    parser.add_argument("--latency", type=float, default=10, help="模拟bot响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="模拟bot延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="模拟bot返回500的比例")
+    parser.add_argument("--reject-rate", type=float, default=0, help="模拟bot业务失败的比例")
+    parser.add_argument("--timeout", type=float, default=120, help="等待异步投递完成的秒数")
+    parser.add_argument("--memory", action="store_true", help="使用tracemalloc统计峰值内存（有额外开销）")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--save", help="保存结果为JSON")
+    parser.add_argument("--compare", help="与基线JSON对比")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="对比时允许的退化比例")
+    args = parser.parse_args()
+
+    results = run(args)
+    print(f"{'scenario':<16}{'ok':>7}{'failed':>8}{'msg/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          f"{'peak KB':>10}{'rss KB':>10}")
+    for scenario, result in results.items():
+        print(f"{scenario:<16}{result['ok']:>7}{result['failed']:>8}{result['throughput']:>10}"
+              f"{result['p50']:>9}{result['p95']:>9}{result['p99']:>9}{result['peak_kb']:>10}{result['rss_kb']:>10}")
+    if args.save:
+        Path(args.save).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
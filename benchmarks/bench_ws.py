@@ -0,0 +1,152 @@
+"""
+WebSocket链路测试与基准：启动本地模拟bot（stub_ws.py），驱动 delivery.ws.OneBotWebSocket
+- calls：多线程并发发送动作，bot乱序返回，校验每个响应都按echo回到了对应的调用，输出吞吐和延迟分位数
+- events：bot推送消息事件，校验全部分发到on_event且记录了bot的self_id
+- reconnect：bot断开连接，测量重连耗时并校验重连后动作正常
+任一校验失败时返回非0
+
+需在MoviePilot环境中运行，插件目录位于 app/plugins/qqmsg，并安装websocket-client：
+    cd /path/to/MoviePilot && python /path/to/benchmarks/bench_ws.py --calls 2000 --concurrency 16 --jitter 20
+"""
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from stub_ws import StubWsBot
+
+from app.plugins.qqmsg.delivery.ws import OneBotWebSocket
+
+SCENARIOS = ("calls", "events", "reconnect")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def wait_until(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return predicate()
+
+
+def run_calls(args, bot: StubWsBot, ws: OneBotWebSocket) -> Dict[str, float]:
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def call(i: int):
+        params = {"group_id": 111, "message": f"bench-{i}"}
+        begin = time.perf_counter()
+        res = ws.call("send_group_msg", params)
+        elapsed = (time.perf_counter() - begin) * 1000
+        with lock:
+            if not res or res.get("retcode") != 0 or (res.get("data") or {}).get("params") != params:
+                failures.append(i)
+            else:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(call, range(args.calls)))
+    elapsed = time.perf_counter() - start
+    return {
+        "ok": len(latencies),
+        "failed": len(failures),
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "p50": round(percentile(latencies, 0.5), 1),
+        "p99": round(percentile(latencies, 0.99), 1),
+    }
+
+
+def run_events(args, bot: StubWsBot, ws: OneBotWebSocket, received: List[dict]) -> Dict[str, float]:
+    received.clear()
+    start = time.perf_counter()
+    for i in range(args.events):
+        bot.push_message(f"event-{i}", user_id=20002, group_id=111 if i % 2 else None, message_id=i)
+    wait_until(lambda: len(received) >= args.events, args.timeout)
+    elapsed = time.perf_counter() - start
+    texts = {event.get("raw_message") for event in received}
+    missing = sum(1 for i in range(args.events) if f"event-{i}" not in texts)
+    return {
+        "ok": args.events - missing,
+        "failed": missing + (0 if ws.self_id == bot.self_id else 1),
+        "throughput": round((args.events - missing) / elapsed, 1) if elapsed else 0,
+        "p50": 0,
+        "p99": 0,
+    }
+
+
+def run_reconnect(args, bot: StubWsBot, ws: OneBotWebSocket) -> Dict[str, float]:
+    start = time.perf_counter()
+    bot.drop()
+    wait_until(lambda: not ws.connected, 5)
+    reconnected = wait_until(lambda: ws.connected, args.timeout)
+    elapsed = (time.perf_counter() - start) * 1000
+    res = ws.call("get_status", {}) if reconnected else None
+    ok = bool(res) and res.get("retcode") == 0
+    return {
+        "ok": int(ok),
+        "failed": int(not ok),
+        "throughput": 0,
+        "p50": round(elapsed, 1),
+        "p99": round(elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000, help="并发动作数")
+    parser.add_argument("--concurrency", type=int, default=8, help="发送线程数")
+    parser.add_argument("--events", type=int, default=500, help="推送的事件数")
+    parser.add_argument("--latency", type=float, default=5, help="模拟bot响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=10, help="延迟抖动上限（毫秒），制造乱序响应")
+    parser.add_argument("--timeout", type=float, default=30, help="等待事件和重连的秒数")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    args = parser.parse_args()
+
+    if not OneBotWebSocket.available():
+        print("websocket-client未安装")
+        sys.exit(2)
+    bot = StubWsBot(latency=args.latency, jitter=args.jitter).start()
+    received: List[dict] = []
+    ws = OneBotWebSocket(url=bot.url, on_event=lambda event: received.append(event)
+                         if event.get("post_type") == "message" else None)
+    ws.start()
+    results = {}
+    try:
+        if not wait_until(lambda: ws.connected, args.timeout):
+            print("连接模拟bot失败")
+            sys.exit(1)
+        for scenario in args.scenarios:
+            if scenario == "calls":
+                results[scenario] = run_calls(args, bot, ws)
+            elif scenario == "events":
+                results[scenario] = run_events(args, bot, ws, received)
+            else:
+                results[scenario] = run_reconnect(args, bot, ws)
+    finally:
+        ws.stop()
+        bot.stop()
+
+    print(f"{'scenario':<12}{'ok':>7}{'failed':>8}{'per s':>10}{'p50 ms':>9}{'p99 ms':>9}")
+    for scenario, result in results.items():
+        print(f"{scenario:<12}{result['ok']:>7}{result['failed']:>8}{result['throughput']:>10}"
+              f"{result['p50']:>9}{result['p99']:>9}")
+    print(f"websocket stats: {ws.stats()}")
+    if any(result["failed"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+本地模拟QQ bot：OneBot v11 HTTP（send_private_msg/send_group_msg/get_status，返回retcode）
+与 send_fastapi_msg（返回status/msg），可配置响应延迟和错误率，供发送链路基准测试使用
+
+单独运行：python benchmarks/stub_bot.py --port 5700 --latency 50 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+from urllib.parse import parse_qs, urlparse
+
+ONEBOT_ACTIONS = {"send_private_msg", "send_group_msg", "get_status"}
+
+
+class StubBot:
+    """
+    在后台线程运行的模拟bot
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0, jitter: float = 0,
+                 error_rate: float = 0, reject_rate: float = 0,
+                 on_request: Optional[Callable[[str, dict, float], None]] = None):
+        """
+        :param port: 监听端口，0为随机
+        :param latency: 响应延迟（毫秒）
+        :param jitter: 延迟随机抖动上限（毫秒）
+        :param error_rate: 返回HTTP 500的比例
+        :param reject_rate: 返回业务失败（retcode/status非0）的比例
+        :param on_request: 收到请求时的回调，参数为动作名、请求体、到达时间（perf_counter）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.reject_rate = reject_rate
+        self.on_request = on_request
+        self.requests = 0
+        self.errors = 0
+        self.rejects = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self.__handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubBot":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-bot", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __handler(self):
+        bot = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 头部和正文分两次写出，关闭Nagle避免keep-alive连接上每个请求多出约40ms的延迟确认等待
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                self.__handle(b"")
+
+            def do_POST(self):
+                self.__handle(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+
+            def __handle(self, raw: bytes):
+                arrived = time.perf_counter()
+                action = urlparse(self.path).path.strip("/").split("/")[-1]
+                payload = self.__payload(raw)
+                with bot._lock:
+                    bot.requests += 1
+                if bot.on_request:
+                    bot.on_request(action, payload, arrived)
+                delay = bot.latency + (random.uniform(0, bot.jitter) if bot.jitter else 0)
+                if delay:
+                    time.sleep(delay / 1000)
+                if action not in ONEBOT_ACTIONS and action != "send_fastapi_msg":
+                    return self.__reply(404, {"msg": "not found"})
+                if random.random() < bot.error_rate:
+                    with bot._lock:
+                        bot.errors += 1
+                    return self.__reply(500, {"msg": "stub error"})
+                rejected = random.random() < bot.reject_rate
+                if rejected:
+                    with bot._lock:
+                        bot.rejects += 1
+                if action == "send_fastapi_msg":
+                    return self.__reply(200, {"status": 1 if rejected else 0, "msg": "rejected" if rejected else "ok"})
+                return self.__reply(200, {"retcode": 100 if rejected else 0, "status": "failed" if rejected else "ok",
+                                          "data": {"message_id": bot.requests}})
+
+            def __payload(self, raw: bytes) -> dict:
+                if not raw:
+                    return {}
+                if "json" in (self.headers.get("Content-Type") or ""):
+                    try:
+                        return json.loads(raw)
+                    except ValueError:
+                        return {}
+                return {key: values[0] for key, values in parse_qs(raw.decode("utf-8")).items()}
+
+            def __reply(self, code: int, body: dict):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5700)
+    parser.add_argument("--latency", type=float, default=0, help="响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="延迟抖动上限（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="HTTP 500比例")
+    parser.add_argument("--reject-rate", type=float, default=0, help="业务失败比例")
+    args = parser.parse_args()
+    bot = StubBot(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                  error_rate=args.error_rate, reject_rate=args.reject_rate).start()
+    print(f"stub bot listening on {bot.url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"requests={bot.requests} errors={bot.errors} rejects={bot.rejects}")
+    except KeyboardInterrupt:
+        bot.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+本地模拟QQ bot的OneBot v11 正向WebSocket：接收动作并按echo回复（可配置延迟，乱序返回），
+连接后推送带self_id的生命周期事件，可主动推送消息事件或断开连接，供WebSocket链路测试使用
+只依赖标准库，实现了服务端所需的最小RFC 6455子集（文本帧、ping/pong、close，不支持分片和扩展）
+
+单独运行：python benchmarks/stub_ws.py --port 3001 --latency 20
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import Callable, List, Optional
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OP_TEXT, OP_CLOSE, OP_PING, OP_PONG = 0x1, 0x8, 0x9, 0xA
+
+
+class StubWsBot:
+    """
+    在后台线程运行的模拟WebSocket bot
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0, jitter: float = 0,
+                 reject_rate: float = 0, self_id: int = 10000,
+                 on_action: Optional[Callable[[str, dict, float], None]] = None):
+        """
+        :param port: 监听端口，0为随机
+        :param latency: 动作响应延迟（毫秒），每个动作在独立线程中处理，延迟不同的动作乱序返回
+        :param jitter: 延迟随机抖动上限（毫秒）
+        :param reject_rate: 返回retcode非0的比例
+        :param self_id: bot自身QQ号，随事件上报
+        :param on_action: 收到动作时的回调，参数为动作名、参数、到达时间（perf_counter）
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.reject_rate = reject_rate
+        self.self_id = self_id
+        self.on_action = on_action
+        self.actions = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._clients: List["_Client"] = []
+        self._server = socketserver.ThreadingTCPServer((host, port), self.__handler(), bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start(self) -> "StubWsBot":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-ws", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.drop()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def push(self, event: dict) -> int:
+        """
+        向所有连接推送事件，返回推送的连接数
+        """
+        event = {"self_id": self.self_id, "time": int(time.time()), **event}
+        with self._lock:
+            clients = list(self._clients)
+        for client in clients:
+            client.send_json(event)
+        return len(clients)
+
+    def push_message(self, text: str, user_id: int = 20002, group_id: int = None, message_id: int = None) -> int:
+        """
+        推送一条私聊或群消息事件
+        """
+        return self.push({
+            "post_type": "message",
+            "message_type": "group" if group_id else "private",
+            "message_id": message_id if message_id is not None else random.randint(1, 2 ** 31),
+            "user_id": user_id,
+            "group_id": group_id,
+            "raw_message": text,
+            "message": [{"type": "text", "data": {"text": text}}],
+            "sender": {"user_id": user_id, "nickname": f"user{user_id}"},
+        })
+
+    def drop(self):
+        """
+        断开所有连接，用于测试客户端重连
+        """
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            client.close()
+
+    def __handler(self):
+        bot = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                client = _Client(self.request)
+                if not client.handshake():
+                    return
+                with bot._lock:
+                    bot._clients.append(client)
+                    bot.connections += 1
+                client.send_json({"self_id": bot.self_id, "time": int(time.time()), "post_type": "meta_event",
+                                  "meta_event_type": "lifecycle", "sub_type": "connect"})
+                try:
+                    while True:
+                        raw = client.recv()
+                        if raw is None:
+                            break
+                        threading.Thread(target=bot._act, args=(client, raw), daemon=True).start()
+                finally:
+                    with bot._lock:
+                        if client in bot._clients:
+                            bot._clients.remove(client)
+                    client.close()
+
+        return Handler
+
+    def _act(self, client: "_Client", raw: str):
+        arrived = time.perf_counter()
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            return
+        action, params = msg.get("action"), msg.get("params") or {}
+        with self._lock:
+            self.actions += 1
+        if self.on_action:
+            self.on_action(action, params, arrived)
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay / 1000)
+        rejected = random.random() < self.reject_rate
+        client.send_json({
+            "status": "failed" if rejected else "ok",
+            "retcode": 100 if rejected else 0,
+            # 原样带回参数，便于校验响应与请求的对应关系
+            "data": {"message_id": self.actions, "params": params},
+            "echo": msg.get("echo"),
+        })
+
+
+class _Client:
+    """
+    单个WebSocket连接，发送加锁，读取只在连接线程中进行
+    """
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self._send_lock = threading.Lock()
+        self._closed = False
+
+    def handshake(self) -> bool:
+        data = b""
+        while b"\r\n\r\n" not in data:
+            chunk = self._sock.recv(4096)
+            if not chunk:
+                return False
+            data += chunk
+        headers = {}
+        for line in data.decode("latin-1").split("\r\n")[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self._sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                            f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return True
+
+    def recv(self) -> Optional[str]:
+        """
+        读取下一条文本消息，连接关闭时返回None
+        """
+        while True:
+            header = self.__read(2)
+            if not header:
+                return None
+            opcode, length = header[0] & 0x0F, header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack(">H", self.__read(2))[0]
+            elif length == 127:
+                length = struct.unpack(">Q", self.__read(8))[0]
+            mask = self.__read(4) if header[1] & 0x80 else b"\x00\x00\x00\x00"
+            payload = bytearray(self.__read(length) if length else b"")
+            for i in range(len(payload)):
+                payload[i] ^= mask[i % 4]
+            if opcode == OP_CLOSE:
+                return None
+            if opcode == OP_PING:
+                self.__send_frame(OP_PONG, bytes(payload))
+                continue
+            if opcode == OP_TEXT:
+                return payload.decode("utf-8")
+
+    def send_json(self, obj: dict):
+        self.__send_frame(OP_TEXT, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self.__send_frame(OP_CLOSE, b"")
+        except OSError:
+            pass
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+    def __read(self, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            try:
+                chunk = self._sock.recv(size - len(data))
+            except OSError:
+                return b""
+            if not chunk:
+                return b""
+            data += chunk
+        return data
+
+    def __send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            try:
+                self._sock.sendall(header + payload)
+            except OSError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--latency", type=float, default=0, help="动作响应延迟（毫秒）")
+    parser.add_argument("--jitter", type=float, default=0, help="延迟抖动上限（毫秒）")
+    parser.add_argument("--reject-rate", type=float, default=0, help="retcode非0比例")
+    args = parser.parse_args()
+    bot = StubWsBot(host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+                    reject_rate=args.reject_rate).start()
+    print(f"stub websocket bot listening on {bot.url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"connections={bot.connections} actions={bot.actions}")
+    except KeyboardInterrupt:
+        bot.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,30 @@
-from urllib.parse import urlencode
-
+from app import schemas
 from app.plugins import _PluginBase
+from app.plugins.qqmsg.delivery import Coalescer, DeliveryQueue, Transport, PRIORITY_NORMAL, \
+    lane_of, priority_of, DeadLetterStore, RetryPolicy, FAIL_FATAL, FAIL_REJECTED, classify_response, \
+    CircuitOpenError, FAIL_OPEN, FAIL_TRANSIENT, OneBotWebSocket, ImageCache, Target, parse_targets, \
+    Router, PayloadBuilder, SEND_TYPES, MessageBuilder, Journal
+from app.chain.message import MessageChain
+from app.core.config import settings
 from app.core.module import ModuleManager
-from app.helper.module import ModuleHelper
+from app.plugins.qqmsg.form import DEFAULTS, alert, count_table, form_rows, row, stat_card
+from app.plugins.qqmsg.qq import QQModule
 from app.core.event import eventmanager, Event
 from app.schemas.types import EventType, NotificationType
-from app.utils.http import RequestUtils
-from typing import Any, List, Dict, Tuple
+from typing import Any, List, Dict, Tuple, Optional
 from app.log import logger
 
+import asyncio
+import copy
 import json
+import threading
+import time
+from collections import deque
+
+# 死信重放失败后的首次重试间隔和最大间隔（秒）
+REPLAY_BACKOFF = 30
+REPLAY_BACKOFF_MAX = 600
+
 
 class QqMsg(_PluginBase):
     # 插件名称
@@ -45,9 +60,81 @@ class QqMsg(_PluginBase):
     _qq_number = None
     # 发送一次测试消息
     _testonce = False
+    # 发送目标路由表，第一个目标为主目标（send_type + qq_number）
+    _router: Router = Router(())
+    # 投递队列容量
+    _queue_size = 1000
+    # 投递工作线程数
+    _queue_workers = 2
+    # 后台投递队列
+    _queue: DeliveryQueue = None
+    # 每个主机的连接池大小
+    _pool_size = 10
+    # 共享的HTTP连接池
+    _transport: Transport = None
+    # 消息合并窗口（秒），0为不合并
+    _coalesce_window = 0
+    # 单条汇总消息最多合并的条数
+    _coalesce_max = 20
+    # 消息合并器
+    _coalescer: Coalescer = None
+    # 每个目标每分钟最多发送条数，0为不限制
+    _rate_limit = 0
+    # 限流允许的突发条数
+    _rate_burst = 5
+    # 发送失败最大重试次数
+    _max_retries = 3
+    # 重试策略
+    _retry: RetryPolicy = None
+    # 重试耗尽后的死信记录，插件启动时重放
+    _deadletter: DeadLetterStore = None
+    # 连续失败多少次后熔断，0为不熔断
+    _breaker_threshold = 5
+    # 熔断后多少秒探测恢复
+    _breaker_timeout = 30
+    # 熔断期间暂存的消息，恢复后重新入队
+    _holding: deque = None
+    _holding_size = 100
+    # 死信重放：bot仍不可用时按退避间隔再次尝试，熔断恢复时立即重放
+    _replay_timer: threading.Timer = None
+    _replay_delay = 0
+    _replay_lock: threading.Lock = None
+    # 使用异步通道发送
+    _async_mode = False
+    # 异步发送的最大在途请求数
+    _async_inflight = 100
+    _inflight: threading.BoundedSemaphore = None
+    # 自适应并发上限的最大值，0为不限制
+    _max_concurrency = 20
+    # OneBot正向WebSocket地址，设置后OneBot动作和事件都走长连接
+    _ws_url = ""
+    _ws: OneBotWebSocket = None
+    # 已注册的QQ交互模块
+    _qq_module: Any = None
+    # 交互列表每页最大字节数和条数
+    _page_bytes = 3000
+    _page_lines = 20
+    # 是否缓存通知图片并以base64发送
+    _image_cache = False
+    # 图片缓存大小上限（MB）
+    _image_cache_size = 100
+    # 缩略图最长边像素，0为不缩放
+    _image_max_side = 1080
+    # fastapi请求体超过该字节数时gzip压缩，0为不压缩
+    _gzip_min = 0
+    # 重复查询回复缓存秒数，0为不缓存
+    _reply_cache_ttl = 120
+    # 各目标预先算好的请求模板
+    _payloads: Dict[tuple, PayloadBuilder] = {}
+    # 是否启用出站预写日志，重启后补发未送达的消息
+    _journal_enabled = True
+    _journal: Journal = None
 
     def init_plugin(self, config: dict = None):
         logger.info(f"初始化插件 {self.plugin_name}")
+        # 停止现有队列，等待已入队消息发送完毕；交互模块保持注册，稍后热更新配置
+        self.__stop_delivery()
+
         if config:
             self._enabled = config.get("enabled")
             self._send_type = config.get("send_type")
@@ -56,18 +143,110 @@ class QqMsg(_PluginBase):
             self._token = config.get("token")
             self._testonce = config.get("testonce")
             self._msgtypes = config.get("msgtypes") or []
+            self._queue_size = self.__to_int(config.get("queue_size"), 1000)
+            self._queue_workers = self.__to_int(config.get("queue_workers"), 2)
+            self._pool_size = self.__to_int(config.get("pool_size"), 10)
+            self._coalesce_window = self.__to_int(config.get("coalesce_window"), 0)
+            self._coalesce_max = self.__to_int(config.get("coalesce_max"), 20)
+            self._rate_limit = self.__to_int(config.get("rate_limit"), 0)
+            self._rate_burst = self.__to_int(config.get("rate_burst"), 5)
+            self._max_retries = self.__to_int(config.get("max_retries"), 3)
+            self._breaker_threshold = self.__to_int(config.get("breaker_threshold"), 5)
+            self._breaker_timeout = self.__to_int(config.get("breaker_timeout"), 30)
+            self._async_mode = config.get("async_mode") or False
+            self._async_inflight = self.__to_int(config.get("async_inflight"), 100)
+            self._max_concurrency = self.__to_int(config.get("max_concurrency"), 20)
+            self._ws_url = config.get("ws_url") or ""
+            self._page_bytes = self.__to_int(config.get("page_bytes"), 3000)
+            self._page_lines = self.__to_int(config.get("page_lines"), 20)
+            self._image_cache = config.get("image_cache") or False
+            self._image_cache_size = self.__to_int(config.get("image_cache_size"), 100)
+            self._image_max_side = self.__to_int(config.get("image_max_side"), 1080)
+            self._gzip_min = self.__to_int(config.get("gzip_min"), 0)
+            self._reply_cache_ttl = self.__to_int(config.get("reply_cache_ttl"), 120)
+            self._journal_enabled = config.get("journal", True) is not False
+            # 整体替换路由表，发送中的事件要么用旧表要么用新表
+            self._router = Router(self.__build_targets(config.get("targets")),
+                                  mtypes=[mtype.name for mtype in NotificationType])
+
+        # 请求体的固定部分按目标预先算好，整体替换
+        self._payloads = {target.key: self.__new_payload(target.send_type, target.number)
+                          for target in self._router.targets}
+
+        # 连接池随插件实例长期存在，停止后下次发送时自动重建
+        if not self._transport:
+            self._transport = Transport()
+        self._transport.configure(pool_size=self._pool_size,
+                                  rate_limit=self._rate_limit,
+                                  rate_burst=self._rate_burst,
+                                  breaker_threshold=self._breaker_threshold,
+                                  breaker_timeout=self._breaker_timeout,
+                                  probe_url=self.__probe_url(),
+                                  probe_headers={'Authorization': f"Bearer {self._token}"} if self._token else None,
+                                  async_mode=self._async_mode,
+                                  max_concurrency=self._max_concurrency)
+        self._inflight = threading.BoundedSemaphore(max(self._async_inflight, 1))
+        self._transport.breaker.on_close = self.__on_breaker_close
+        if self._replay_lock is None:
+            self._replay_lock = threading.Lock()
+        if self._holding is None:
+            self._holding = deque()
+        if self._image_cache:
+            self._transport.images = ImageCache(self.get_data_path() / "images",
+                                                fetch=self._transport.fetch,
+                                                max_bytes=self._image_cache_size * 1024 * 1024,
+                                                max_side=self._image_max_side)
+        else:
+            self._transport.images = None
         
-        if not self._send_msg_url or not self._qq_number:
+        if not (self._send_msg_url or self._ws_url) or not self._router.targets:
             self._enabled = False
-        
-        # send_fastapi_msg默认开启交互
-        if self._send_type == 'send_fastapi_msg':
-            if self.modulemanager:
-                if self.modulemanager.get_modules('message_parser') == []:
-                    self.register_module()
+
+        if self._enabled and self._ws_url:
+            if OneBotWebSocket.available():
+                self._ws = OneBotWebSocket(url=self._ws_url, token=self._token, on_event=self.__on_ws_event)
+                self._ws.start()
+                self._transport.ws = self._ws
             else:
-                self.modulemanager = ModuleManager()
-                self.register_module()
+                logger.warn("未安装websocket-client，无法使用WebSocket连接QQ bot")
+
+        self._retry = RetryPolicy(max_retries=self._max_retries)
+        if not self._deadletter:
+            self._deadletter = DeadLetterStore(self.get_data_path() / "deadletter.jsonl")
+
+        replay = []
+        if self._enabled and self._journal_enabled:
+            self._journal = Journal(self.get_data_path() / "journal")
+            try:
+                replay = self._journal.open()
+            except Exception as err:
+                logger.error(f"打开QQ消息预写日志失败：{str(err)}")
+                self._journal = None
+
+        if self._enabled:
+            # 每个目标一条投递，工作线程不少于目标数，多个目标并发发送
+            self._queue = DeliveryQueue(handler=self.__deliver,
+                                        maxsize=self._queue_size,
+                                        workers=max(self._queue_workers, min(len(self._router), 8)),
+                                        name="qqmsg-delivery")
+            self._queue.start()
+            self._coalescer = Coalescer(window=self._coalesce_window,
+                                        flush=self.__flush_batch,
+                                        max_batch=self._coalesce_max)
+            # 上次进程中断时未确认的消息重新入队
+            if replay:
+                logger.info(f"预写日志中有 {len(replay)} 条未确认的QQ消息，重新投递")
+                self.__to_deadletter([item for item in replay if not self._queue.put(item)],
+                                     reason="重放预写日志时入队失败")
+            # 后台重放上次未送达的消息
+            if self._deadletter.count:
+                self.__schedule_replay()
+        
+        # send_fastapi_msg和WebSocket默认开启交互
+        if any(target.send_type == 'send_fastapi_msg' for target in self._router.targets) or self._ws:
+            self.register_module()
+        else:
+            self.unregister_module()
         
         if self._testonce and self._enabled:
             logger.info(f"发送qq测试消息")
@@ -75,29 +254,112 @@ class QqMsg(_PluginBase):
             self._testonce = False
 
             self.update_config({
-                "testonce": False,
-                "enabled": self._enabled,
-                "send_type": self._send_type,
-                "msg_url": self._send_msg_url,
-                "qq_number": self._qq_number,
-                "token": self._token,
-                "msgtypes": self._msgtypes or []
+                **config,
+                "testonce": False
             })
 
+    def __on_ws_event(self, event: dict):
+        """
+        WebSocket收到的OneBot消息事件，转换为message_parser的格式后交给消息链处理
+        """
+        if event.get("post_type") != "message":
+            return
+        message_type = event.get("message_type")
+        user_id = event.get("user_id")
+        group_id = event.get("group_id")
+        # 只处理配置的私聊账号或群的消息
+        number = str(group_id if message_type == "group" else user_id)
+        if not any(target.number == number for target in self._router.targets):
+            return
+        message = event.get("message")
+        if isinstance(message, list):
+            text = "".join(seg.get("data", {}).get("text", "") for seg in message if seg.get("type") == "text")
+        else:
+            text = event.get("raw_message") or message or ""
+        text = text.strip()
+        if not text:
+            return
+        body = {
+            "is_qq": True,
+            "message": {
+                "message_id": event.get("message_id"),
+                "user_id": user_id,
+                "group_id": group_id if message_type == "group" else None,
+                "username": (event.get("sender") or {}).get("nickname"),
+                "date": event.get("time"),
+                "text": text
+            }
+        }
+        MessageChain().process(body=json.dumps(body, ensure_ascii=False), form={},
+                               args={"token": settings.API_TOKEN})
+
+    def __probe_url(self) -> str:
+        """
+        熔断后的健康探测地址，OneBot使用get_status接口
+        """
+        if not self._send_msg_url:
+            return ""
+        if self._send_type in ("send_private_msg", "send_group_msg"):
+            return f"{self._send_msg_url}/get_status"
+        return self._send_msg_url
+
+    def __build_targets(self, text: str = None) -> List[Target]:
+        """
+        主目标加上多目标配置中的其它目标，与主目标重复的忽略
+        """
+        targets = []
+        if self._send_type and self._qq_number:
+            targets.append(Target(self._send_type, self._qq_number, self._msgtypes))
+        keys = {target.key for target in targets}
+        targets.extend(target for target in parse_targets(text) if target.key not in keys)
+        return targets
+
+    @staticmethod
+    def __to_int(value: Any, default: int) -> int:
+        try:
+            return int(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
     def register_module(self):
-        modules = ModuleHelper.load(
-            "app.plugins.qqmsg",
-            filter_func=lambda _, obj: hasattr(obj, 'init_module') and hasattr(obj, 'init_setting')
-        )
-        for module in modules:
-            module_id = module.__name__
-            self.modulemanager._modules[module_id] = module
-            # 生成实例
-            _module = module()
-            # 初始化模块
-            _module.init_module(url=f"{self._send_msg_url}/send_fastapi_msg",num=self._qq_number)
-            self.modulemanager._running_modules[module_id] = _module
-            logger.info(f"Moudle Loaded：{module_id}")
+        """
+        注册QQ交互模块，已注册时只热更新配置，不重新加载和实例化
+        """
+        if not self.modulemanager:
+            self.modulemanager = ModuleManager()
+        module_id = QQModule.__name__
+        registered = self._qq_module is not None \
+            and self.modulemanager._running_modules.get(module_id) is self._qq_module
+        _module = self._qq_module if registered else QQModule()
+        # 交互回复走fastapi时使用fastapi目标的号码，只有WebSocket时使用主目标号码
+        fastapi = next((target for target in self._router.targets if target.send_type == 'send_fastapi_msg'), None)
+        _module.init_module(url=f"{self._send_msg_url}/send_fastapi_msg",
+                            num=fastapi.number if fastapi else self._qq_number,
+                            transport=self._transport,
+                            page_bytes=self._page_bytes, page_lines=self._page_lines,
+                            token=self._token, gzip_min=self._gzip_min,
+                            cache_ttl=self._reply_cache_ttl)
+        if registered:
+            logger.info(f"Moudle Reconfigured：{module_id}")
+            return
+        self.modulemanager._modules[module_id] = QQModule
+        self.modulemanager._running_modules[module_id] = _module
+        self._qq_module = _module
+        logger.info(f"Moudle Loaded：{module_id}")
+
+    def unregister_module(self):
+        """
+        注销QQ交互模块
+        """
+        if not self._qq_module:
+            return
+        module_id = QQModule.__name__
+        if self.modulemanager and self.modulemanager._running_modules.get(module_id) is self._qq_module:
+            self.modulemanager._running_modules.pop(module_id, None)
+            self.modulemanager._modules.pop(module_id, None)
+        self._qq_module.stop()
+        self._qq_module = None
+        logger.info(f"Moudle Unloaded：{module_id}")
 
 
     def get_state(self) -> bool:
@@ -108,196 +370,121 @@ class QqMsg(_PluginBase):
         pass
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [{
+            "path": "/stats",
+            "endpoint": self.get_stats,
+            "methods": ["GET"],
+            "summary": "投递统计",
+            "description": "查询QQ消息投递队列深度、发送计数、延迟分位数等统计信息",
+        }]
+
+    def get_stats(self, apikey: str) -> Any:
+        """
+        投递统计API
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        return {
+            "queue": self._queue.stats() if self._queue else {},
+            "coalesce": self._coalescer.stats() if self._coalescer else {},
+            "ratelimit": self._transport.limiter.stats() if self._transport else {},
+            "deadletter": self._deadletter.count if self._deadletter else 0,
+            "concurrency": self._transport.concurrency.stats() if self._transport else {},
+            "breaker": {
+                **(self._transport.breaker.stats() if self._transport else {}),
+                "holding": len(self._holding) if self._holding else 0
+            },
+            "websocket": self._ws.stats() if self._ws else {},
+            "images": self._transport.images.stats() if self._transport and self._transport.images else {},
+            "journal": self._journal.stats() if self._journal else {},
+            "inbound": self._qq_module.stats() if self._qq_module else {},
+            "metrics": self._transport.metrics.stats() if self._transport else {}
+        }
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """
         拼装插件配置页面，需要返回两块数据：1、页面配置；2、数据结构
+        静态部分每个进程只构建一次，这里只生成运行状态
         """
-        # 编历 NotificationType 枚举，生成消息类型选项
-        MsgTypeOptions = []
-        for item in NotificationType:
-            MsgTypeOptions.append({
-                "title": item.value,
-                "value": item.name
-            })
         return [
             {
                 'component': 'VForm',
-                'content': [
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VSwitch',
-                                        'props': {
-                                            'model': 'enabled',
-                                            'label': '启用插件',
-                                        }
-                                    }
-                                ]
-                            },
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VSwitch',
-                                        'props': {
-                                            'model': 'testonce',
-                                            'label': '测试消息发送',
-                                        }
-                                    }
-                                ]
-                            },
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 8
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextField',
-                                        'props': {
-                                            'model': 'msg_url',
-                                            'label': '消息发送地址',
-                                            'placeholder': 'http://{ip}:{port}',
-                                        }
-                                    }
-                                ]
-                            },
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 4
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VSelect',
-                                        'props': {
-                                            'model': 'send_type',
-                                            'label': '消息发送方式',
-                                            'items': [
-                                                {'title': 'Http正向私聊', 'value': 'send_private_msg'},
-                                                {'title': 'Http正向群聊', 'value': 'send_group_msg'},
-                                                {'title': 'bot内fastapi', 'value': 'send_fastapi_msg'},
-                                            ]
-                                        }
-                                    }
-                                ]
-                            },
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextField',
-                                        'props': {
-                                            'model': 'qq_number',
-                                            'label': '私聊账号/群号',
-                                            'placeholder': 'qq号/群号',
-                                        }
-                                    }
-                                ]
-                            },
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                    'md': 6
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VTextField',
-                                        'props': {
-                                            'model': 'token',
-                                            'label': 'QQ令牌',
-                                            'placeholder': 'http access_token',
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VSelect',
-                                        'props': {
-                                            'multiple': True,
-                                            'chips': True,
-                                            'model': 'msgtypes',
-                                            'label': '消息类型',
-                                            'items': MsgTypeOptions
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    },
-                    {
-                        'component': 'VRow',
-                        'content': [
-                            {
-                                'component': 'VCol',
-                                'props': {
-                                    'cols': 12,
-                                },
-                                'content': [
-                                    {
-                                        'component': 'VAlert',
-                                        'props': {
-                                            'type': 'info',
-                                            'variant': 'tonal',
-                                            'text': '消息交互只适用send_fastapi_msg方式,使用说明https://homev6.anjoy.top/wordpress/2023/12/25/moviepilot/'
-                                        }
-                                    }
-                                ]
-                            }
-                        ]
-                    }
-                ]
+                'content': [*form_rows(), *self.__status_rows()]
             }
-        ], {
-            "enabled": False,
-            'token': '',
-            'msgtypes': []
-        }
+        ], copy.deepcopy(DEFAULTS)
+
+    def __status_rows(self) -> List[dict]:
+        """
+        配置页面顶部之外的运行状态：发送目标和投递统计
+        """
+        if not self._transport or not self._router.targets:
+            return []
+        metrics = self._transport.metrics
+        breaker = self._transport.breaker.stats()
+        targets = "；".join(f"{target.send_type}:{target.number}"
+                           + (f"（{','.join(sorted(target.msgtypes))}）" if target.msgtypes else "")
+                           for target in self._router.targets)
+        return [
+            row(stat_card("已发送", metrics.count("sent")),
+                stat_card("失败", metrics.count("failed")),
+                stat_card("重试", metrics.count("retried")),
+                stat_card("队列深度", self._queue.depth if self._queue else 0),
+                stat_card("死信", self._deadletter.count if self._deadletter else 0),
+                stat_card("熔断", breaker.get("state", ""))),
+            row(alert(f"当前发送目标：{targets}"))
+        ]
 
     def get_page(self) -> List[dict]:
-        pass
+        """
+        投递统计面板
+        """
+        if not self._transport:
+            return [{
+                'component': 'div',
+                'text': '暂无数据',
+                'props': {
+                    'class': 'text-center',
+                }
+            }]
+        metrics = self._transport.metrics.stats()
+        counters = metrics.get("counters", {})
+        notify = metrics.get("latency_ms", {}).get("notify", {})
+        reply = metrics.get("latency_ms", {}).get("reply", {})
+        names = ("sent", "failed", "retried", "dropped", "held")
+
+        def total(name: str) -> int:
+            return counters.get(name, {}).get("total", 0)
+
+        def rows(by: str) -> List[list]:
+            labels = sorted({label for name in names for label in counters.get(name, {}).get(by, {})})
+            return [[label, *[counters.get(name, {}).get(by, {}).get(label, 0) for name in names]]
+                    for label in labels]
+
+        cards = [
+            ("已发送", total("sent")),
+            ("失败", total("failed")),
+            ("重试", total("retried")),
+            ("丢弃", total("dropped")),
+            ("队列深度", self._queue.depth if self._queue else 0),
+            ("入站消息", total("inbound")),
+            ("通知 P50", f"{notify.get('p50', 0)}ms"),
+            ("通知 P95", f"{notify.get('p95', 0)}ms"),
+            ("通知 P99", f"{notify.get('p99', 0)}ms"),
+            ("回复 P50", f"{reply.get('p50', 0)}ms"),
+            ("回复 P95", f"{reply.get('p95', 0)}ms"),
+            ("回复 P99", f"{reply.get('p99', 0)}ms"),
+            ("并发上限", self._transport.metrics.value("concurrency_limit") or "不限"),
+            ("在途请求", self._transport.metrics.value("concurrency_inflight")),
+        ]
+        header = ["发送", "失败", "重试", "丢弃", "熔断暂存"]
+        return [
+            {
+                'component': 'VRow',
+                'content': [stat_card(title, value) for title, value in cards]
+            },
+            count_table("消息类型", header, rows("by_type")),
+            count_table("发送目标", header, rows("by_target"))
+        ]
 
 
     @eventmanager.register(EventType.NoticeMessage)
@@ -329,89 +516,459 @@ class QqMsg(_PluginBase):
             logger.warn("标题和内容不能同时为空")
             return
 
-        if (msg_type and self._msgtypes
-                and msg_type.name not in self._msgtypes):
-            logger.info(f"消息类型 {msg_type.value} 未开启消息发送")
+        mtype = msg_type.name if msg_type else None
+        targets = self._router.resolve(mtype, title)
+        if not targets:
+            logger.info(f"消息类型 {msg_type.value if msg_type else ''} 未匹配到发送目标：{title}")
             return
 
+        if not self._coalescer:
+            logger.warn(f"QQ消息投递未启动，已丢弃：{title}")
+            self._transport.metrics.incr("dropped", mtype=mtype)
+            return
+        # 每个目标单独入队，由工作线程并发发送；同类型、同目标的消息在窗口内合并
+        # 先写预写日志再入队，入队后立即返回，由后台线程发送，避免阻塞事件分发
+        for target in targets:
+            self._coalescer.add((mtype, target.send_type, target.number), self.__journaled({
+                "title": title,
+                "text": text,
+                "image": "" if image is None else image,
+                "user": "Anjoy",
+                "priority": priority_of(mtype),
+                "send_type": target.send_type,
+                "number": target.number,
+                "mtype": mtype
+            }))
+
+    def __journaled(self, item: dict) -> dict:
+        """
+        消息写入预写日志，幂等键记录在keys中，送达或转入死信后确认
+        """
+        if self._journal:
+            try:
+                key = self._journal.append(item)
+                if key:
+                    item["keys"] = [key]
+            except Exception as err:
+                logger.error(f"写入QQ消息预写日志失败：{str(err)}")
+        return item
+
+    def __ack(self, items: List[dict]):
+        keys = [key for item in items for key in item.get("keys") or ()]
+        if not keys or not self._journal:
+            return
         try:
-            state, res = self.send_msg_to_qq(title=title,
-                                        text=text,
-                                        image=""if image == None else image,
-                                        user="Anjoy")
-        except Exception as msg_e:
-            logger.error(f"QQ消息发送失败，{str(msg_e)}")
-
-    
-    def send_msg_to_qq(self, title, text="", image="", user=""):
-        headers = {'content-type': 'application/x-www-form-urlencoded'}
-        message_url = self._send_msg_url
-        req_json = {
-            "user_id": self._qq_number,
-            "group_id": self._qq_number,
-        }
-        
-        content = "%s\n%s" % (title, text.replace("\n\n", "\n")) if text else title
-        data = {
-            "user": user,
-            "title": title,
-            "image": image,
-            "text": content
+            self._journal.ack(keys)
+        except Exception as err:
+            logger.error(f"写入QQ消息预写日志失败：{str(err)}")
+
+    def __to_deadletter(self, items: List[dict], reason: str = ""):
+        """
+        写入死信后确认预写日志，之后由死信负责重放
+        """
+        if not items:
+            return
+        if self._deadletter:
+            self._deadletter.extend(items, reason=reason)
+        self.__ack(items)
+
+    def __flush_batch(self, key: tuple, items: List[dict]):
+        """
+        合并窗口到期，将窗口内的消息汇总为一条后入队
+        """
+        item = items[0] if len(items) == 1 else self.__merge_items(items)
+        if not self._queue or not self._queue.put(item):
+            logger.warn(f"QQ消息入队失败，已丢弃：{item.get('title')}")
+            self._transport.metrics.incr("dropped", mtype=item.get("mtype"), target=self.__target_of(item))
+            self.__ack([item])
+
+    def __merge_items(self, items: List[dict]) -> dict:
+        """
+        将多条消息汇总为一条摘要消息
+        """
+        contents = [f"{index}. {self.__build_content(item.get('title'), item.get('text'))}"
+                    for index, item in enumerate(items, start=1)]
+        return {
+            "title": f"{items[0].get('title')} 等{len(items)}条消息",
+            "text": "\n".join(contents),
+            "image": next((item.get("image") for item in items if item.get("image")), ""),
+            "user": items[0].get("user"),
+            "priority": min(item.get("priority", PRIORITY_NORMAL) for item in items),
+            "send_type": items[0].get("send_type"),
+            "number": items[0].get("number"),
+            "mtype": items[0].get("mtype"),
+            "keys": [key for item in items for key in item.get("keys") or ()]
         }
 
-        if self._token:
-            headers['Authorization'] = f"Bearer {self._token}"
+    @staticmethod
+    def __build_content(title: str, text: str = "") -> str:
+        return "%s\n%s" % (title, text.replace("\n\n", "\n")) if text else title
+
+    def __deliver(self, item: dict):
+        """
+        后台投递队列的消费函数，启用异步时只提交到事件循环，不等待结果
+        """
+        aio = self._transport.aio if self._transport else None
+        start = time.monotonic()
+        if aio:
+            inflight = self._inflight
+            # 在途请求达到上限时阻塞工作线程，形成背压
+            inflight.acquire()
+            future = aio.submit(self.async_send_msg_to_qq(title=item.get("title"),
+                                                          text=item.get("text"),
+                                                          image=item.get("image"),
+                                                          user=item.get("user"),
+                                                          priority=item.get("priority", PRIORITY_NORMAL),
+                                                          send_type=item.get("send_type"),
+                                                          number=item.get("number")))
+
+            def done(f):
+                inflight.release()
+                try:
+                    state, res, fail = f.result()
+                except Exception as err:
+                    state, res, fail = False, str(err), FAIL_FATAL
+                self.__on_result(item, state, res, fail, time.monotonic() - start)
 
-        if self._send_type == "send_private_msg" or self._send_type == "send_group_msg":
-            return self.__post_request(f"{message_url}/{self._send_type}", headers, {**req_json, **{'message': f'''#{title}\n{content}'''}})
-        elif self._send_type == "send_fastapi_msg":
-            headers['content-type'] = 'application/json'
-            return self.__post_fastapi_request(f"{message_url}/send_fastapi_msg", headers, {**req_json, **data})
-  
+            future.add_done_callback(done)
+            return
+        state, res, fail = self.send_msg_to_qq(title=item.get("title"),
+                                               text=item.get("text"),
+                                               image=item.get("image"),
+                                               user=item.get("user"),
+                                               priority=item.get("priority", PRIORITY_NORMAL),
+                                               send_type=item.get("send_type"),
+                                               number=item.get("number"))
+        self.__on_result(item, state, res, fail, time.monotonic() - start)
 
-    def __post_request(self, message_url, headers, req_json):
+    def __on_result(self, item: dict, state: bool, res: Any, fail: str, elapsed: float = 0):
         """
-        向qq发送请求
+        处理发送结果，失败时按分类退避重试，重试耗尽后写入死信
         """
-        try:
-            res = RequestUtils(headers=headers).post(message_url,
-                                                     data=urlencode(req_json))
-            if res and res.status_code == 200:
-                ret_json = res.json()
-                if ret_json.get('retcode') == 0:
-                    return True, ret_json.get('status')
-                else:
-                    return False, ret_json.get('status')
-            elif res is not None:
-                return False, f"错误码：{res.status_code}，错误原因：{res.reason}"
+        metrics, mtype, target = self._transport.metrics, item.get("mtype"), self.__target_of(item)
+        if fail != FAIL_OPEN:
+            # 熔断直接拒绝的不计入发送耗时
+            metrics.observe("notify", elapsed)
+        if state:
+            metrics.incr("sent", mtype=mtype, target=target)
+            self.__ack([item])
+            return
+        if fail == FAIL_OPEN:
+            metrics.incr("held", mtype=mtype, target=target)
+            self.__hold(item)
+            return
+        attempt = item.get("attempt", 0)
+        delay = self._retry.next_delay(fail, attempt) if self._retry else None
+        if delay is not None and self._queue and self._queue.running:
+            logger.warn(f"QQ消息发送失败，{res}，{delay:.1f}秒后第{attempt + 1}次重试")
+            metrics.incr("retried", mtype=mtype, target=target)
+            self._queue.put_later({**item, "attempt": attempt + 1}, delay)
+            return
+        logger.error(f"QQ消息发送失败，{res}")
+        metrics.incr("failed", mtype=mtype, target=target)
+        self.__to_deadletter([{**item, "attempt": 0}], reason=str(res))
+
+    def __target_of(self, item: dict) -> str:
+        return f"{item.get('send_type') or self._send_type}:{item.get('number') or self._qq_number}"
+
+    def __drain_inflight(self, timeout: float = 10):
+        """
+        等待异步在途请求结束
+        """
+        deadline = time.monotonic() + timeout
+        acquired = 0
+        for _ in range(max(self._async_inflight, 1)):
+            if not self._inflight.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                logger.warn("等待异步在途QQ消息超时")
+                break
+            acquired += 1
+        for _ in range(acquired):
+            self._inflight.release()
+
+    def __hold(self, item: dict):
+        """
+        熔断期间暂存消息，超出容量的最早消息转入死信
+        """
+        if self._holding is None:
+            return
+        self._holding.append(item)
+        while len(self._holding) > self._holding_size:
+            try:
+                overflow = self._holding.popleft()
+            except IndexError:
+                break
+            self.__to_deadletter([overflow], reason="熔断期间暂存已满")
+
+    def __on_breaker_close(self):
+        """
+        熔断恢复：暂存的消息重新入队，死信立即重放
+        """
+        self.__release_holding()
+        if self._deadletter and self._deadletter.count:
+            self.__schedule_replay()
+
+    def __schedule_replay(self, delay: float = 0):
+        """
+        在后台线程重放死信，delay秒后执行；已有等待中的重放时以新的为准
+        """
+        if self._replay_timer:
+            self._replay_timer.cancel()
+        timer = threading.Timer(delay, self.__replay_deadletter)
+        timer.name = "qqmsg-replay"
+        timer.daemon = True
+        self._replay_timer = timer
+        timer.start()
+
+    def __release_holding(self):
+        """
+        熔断恢复，暂存的消息重新入队
+        """
+        released = 0
+        while self._holding:
+            try:
+                item = self._holding.popleft()
+            except IndexError:
+                break
+            if self._queue and self._queue.put(item):
+                released += 1
             else:
-                return False, "未获取到返回信息"
+                self.__to_deadletter([item], reason="熔断恢复后入队失败")
+        if released:
+            logger.info(f"熔断恢复，{released} 条暂存消息重新入队")
+
+    def __replay_deadletter(self):
+        """
+        重放死信：先同步发送第一条探测bot是否恢复，成功后其余消息重新入队；
+        仍不可用时写回死信，按退避间隔再试，熔断恢复时也会立即重放
+        """
+        if not self._queue or not self._queue.running:
+            return
+        if not self._replay_lock.acquire(blocking=False):
+            return
+        try:
+            self.__do_replay_deadletter()
+        finally:
+            self._replay_lock.release()
+
+    def __do_replay_deadletter(self):
+        # 探测消息送达前死信文件保持不变，发送中途进程退出也不会丢失
+        first = self._deadletter.peek()
+        if not first:
+            return
+        state, res, _ = self.send_msg_to_qq(title=first.get("title"),
+                                            text=first.get("text"),
+                                            image=first.get("image"),
+                                            user=first.get("user"),
+                                            priority=first.get("priority", PRIORITY_NORMAL),
+                                            send_type=first.get("send_type"),
+                                            number=first.get("number"))
+        if not state:
+            self._replay_delay = min(max(self._replay_delay * 2, REPLAY_BACKOFF), REPLAY_BACKOFF_MAX)
+            logger.warn(f"QQ消息发送地址仍不可用，{self._deadletter.count} 条死信 {self._replay_delay} 秒后再重放：{res}")
+            if self._queue and self._queue.running:
+                self.__schedule_replay(self._replay_delay)
+            return
+        self._replay_delay = 0
+        replayed = self._deadletter.drain(lambda records: self.__requeue_deadletter(records, first))
+        logger.info(f"已重放 {replayed} 条QQ死信消息")
+
+    def __requeue_deadletter(self, records: List[dict], sent: dict) -> List[dict]:
+        """
+        死信重新入队：先写入预写日志并刷盘，再从死信文件移除，之后由日志负责崩溃后的重放
+        :param sent: 已作为探测发送成功的记录，不再入队
+        :return: 入队失败、需要留在死信中的记录
+        """
+        if records[0] == sent:
+            records = records[1:]
+        items = [self.__journaled({k: v for k, v in record.items() if k != "keys"}) for record in records]
+        if self._journal:
+            try:
+                self._journal.sync()
+            except Exception as err:
+                # 日志未落盘时不移出死信，等下次重放
+                logger.error(f"写入QQ消息预写日志失败：{str(err)}")
+                self.__ack(items)
+                return records
+        remain = []
+        for record, item in zip(records, items):
+            if self._journal and not item.get("keys"):
+                # 写入日志失败的留在死信中
+                remain.append(record)
+                continue
+            if not self._queue or not self._queue.put(item):
+                self.__ack([item])
+                remain.append(record)
+        return remain
+
+    def send_msg_to_qq(self, title, text="", image="", user="", priority=PRIORITY_NORMAL,
+                       send_type=None, number=None):
+        """
+        发送一条消息，未指定目标时发给主目标
+        """
+        send_type, number = send_type or self._send_type, number or self._qq_number
+        image = self._transport.image(image)
+        if self.__use_ws(send_type):
+            return self.__post_ws(title, text, image, priority, send_type, number)
+        request = self.__build_request(title, text, image, user, send_type, number)
+        if not request:
+            return False, f"不支持的发送方式：{send_type}", FAIL_FATAL
+        message_url, headers, data, lane, fastapi = request
+        return self.__post_request(message_url, headers, data, fastapi=fastapi, lane=lane, priority=priority)
+
+    async def async_send_msg_to_qq(self, title, text="", image="", user="", priority=PRIORITY_NORMAL,
+                                   send_type=None, number=None):
+        """
+        send_msg_to_qq的异步版本，在异步通道的事件循环上运行
+        """
+        send_type, number = send_type or self._send_type, number or self._qq_number
+        loop = asyncio.get_running_loop()
+        if self._transport.images and image:
+            # 图片下载和缩放是阻塞操作，放到线程池执行
+            image = await loop.run_in_executor(None, self._transport.image, image)
+        if self.__use_ws(send_type):
+            # WebSocket调用本身是等待响应的阻塞实现，放到线程池执行
+            return await loop.run_in_executor(None, self.__post_ws, title, text, image, priority,
+                                              send_type, number)
+        request = self.__build_request(title, text, image, user, send_type, number)
+        if not request:
+            return False, f"不支持的发送方式：{send_type}", FAIL_FATAL
+        message_url, headers, data, lane, fastapi = request
+        try:
+            res = await self._transport.apost(message_url, headers=headers, data=data,
+                                              lane=lane, priority=priority)
+            return self.__parse_response(res, fastapi)
+        except CircuitOpenError as err:
+            return False, str(err), FAIL_OPEN
         except Exception as err:
-            return False, str(err)
+            return False, str(err), FAIL_FATAL
+
+    def __use_ws(self, send_type: str) -> bool:
+        return bool(self._transport and self._transport.ws
+                    and send_type in ("send_private_msg", "send_group_msg"))
 
-    def __post_fastapi_request(self, message_url, headers, req_json):
+    def __post_ws(self, title, text="", image="", priority=PRIORITY_NORMAL, send_type=None, number=None):
         """
-        向qq发送请求
+        通过WebSocket长连接发送OneBot动作
         """
+        content = self.__build_content(title, text)
+        payload = self.__payload(send_type, number)
         try:
-            res = RequestUtils(headers=headers).post(message_url,
-                                                     data=json.dumps(req_json, ensure_ascii=False).encode('utf-8'))
-            if res and res.status_code == 200:
-                ret_json = res.json()
-                if ret_json.get('status') == 0:
-                    return True, ret_json.get('msg')
-                else:
-                    return False, ret_json.get('msg')
-            elif res is not None:
-                return False, f"错误码：{res.status_code}，错误原因：{res.reason}"
+            res = self._transport.call(send_type,
+                                       payload.params(self.__onebot_message(title, content, image)),
+                                       lane=lane_of(send_type, number),
+                                       priority=priority)
+        except CircuitOpenError as err:
+            return False, str(err), FAIL_OPEN
+        if res is None:
+            return False, "WebSocket未连接或响应超时", FAIL_TRANSIENT
+        if res.get("retcode") == 0:
+            return True, res.get("status"), None
+        return False, res.get("wording") or res.get("msg") or res.get("status"), FAIL_REJECTED
+
+    def __payload(self, send_type: str, number: Any) -> Optional[PayloadBuilder]:
+        """
+        取目标预先算好的请求模板，没有时（如旧死信记录的目标）临时创建，不支持的发送方式返回None
+        """
+        payload = self._payloads.get((send_type, str(number)))
+        if payload is None and send_type in SEND_TYPES:
+            payload = self.__new_payload(send_type, number)
+        return payload
+
+    def __new_payload(self, send_type: str, number: Any) -> PayloadBuilder:
+        return PayloadBuilder(url=f"{self._send_msg_url}/{send_type}",
+                              send_type=send_type,
+                              number=number,
+                              token=self._token,
+                              gzip_min=self._gzip_min)
+
+    def __build_request(self, title, text="", image="", user="", send_type=None, number=None):
+        """
+        组装请求地址、请求头、请求体和限流通道，不支持的发送方式返回None
+        """
+        payload = self.__payload(send_type, number)
+        if not payload:
+            return None
+        content = self.__build_content(title, text)
+        if payload.fastapi:
+            headers, data = payload.fastapi_body(user=user, title=title, image=image, text=content)
+        else:
+            headers, data = payload.onebot(self.__onebot_message(title, content, image))
+        return payload.url, headers, data, lane_of(send_type, number), payload.fastapi
+
+    @staticmethod
+    def __onebot_message(title: str, content: str, image: str = "") -> List[dict]:
+        """
+        OneBot消息段，只有缓存过的base64图片才附带图片，避免bot下载失败导致整条消息发送失败
+        """
+        builder = MessageBuilder()
+        if image and image.startswith("base64://"):
+            builder.image(image)
+        return builder.text(f"#{title}\n{content}").build()
+
+    @staticmethod
+    def __parse_response(res, fastapi: bool = False):
+        """
+        解析bot返回，OneBot以retcode判断成功，fastapi bot以status判断
+        """
+        code_key, msg_key = ('status', 'msg') if fastapi else ('retcode', 'status')
+        fail = classify_response(res)
+        if not fail:
+            ret_json = res.json()
+            if ret_json.get(code_key) == 0:
+                return True, ret_json.get(msg_key), None
             else:
-                return False, "未获取到返回信息"
+                return False, ret_json.get(msg_key), FAIL_REJECTED
+        elif res is not None:
+            return False, f"错误码：{res.status_code}，错误原因：{res.reason}", fail
+        else:
+            return False, "未获取到返回信息", fail
+
+    def __post_request(self, message_url, headers, data, fastapi=False, lane=None, priority=PRIORITY_NORMAL):
+        """
+        向qq发送请求
+        """
+        try:
+            res = self._transport.post(message_url, headers=headers, data=data,
+                                       lane=lane, priority=priority)
+            return self.__parse_response(res, fastapi)
+        except CircuitOpenError as err:
+            return False, str(err), FAIL_OPEN
         except Exception as err:
-            return False, str(err)
-    
+            return False, str(err), FAIL_FATAL
 
     def stop_service(self):
         """
         退出插件
         """
-        pass
+        self.__stop_delivery()
+        self.unregister_module()
+
+    def __stop_delivery(self):
+        """
+        停止投递：未发送的消息写入死信，关闭长连接和连接池
+        """
+        if self._replay_timer:
+            self._replay_timer.cancel()
+            self._replay_timer = None
+        if self._coalescer:
+            self._coalescer.flush_all()
+            self._coalescer = None
+        if self._queue:
+            # 未发送完的消息写入死信，下次启动时重放
+            leftover = self._queue.stop()
+            self.__to_deadletter(leftover, reason="插件停止时未发送")
+            self._queue = None
+        if self._inflight:
+            self.__drain_inflight()
+        if self._holding:
+            self.__to_deadletter(list(self._holding), reason="熔断期间插件停止")
+            self._holding.clear()
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+        if self._ws:
+            self._ws.stop()
+            self._ws = None
+        if self._transport:
+            self._transport.ws = None
+            self._transport.close()
@@ -0,0 +1,17 @@
+from app.plugins.qqmsg.delivery.aio import AsyncTransport
+from app.plugins.qqmsg.delivery.dispatch import DeliveryQueue
+from app.plugins.qqmsg.delivery.transport import Transport
+from app.plugins.qqmsg.delivery.coalesce import Coalescer
+from app.plugins.qqmsg.delivery.ratelimit import PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_NORMAL, \
+    RateLimiter, lane_of, priority_of
+from app.plugins.qqmsg.delivery.retry import FAIL_FATAL, FAIL_REJECTED, FAIL_TRANSIENT, DeadLetterStore, \
+    RetryPolicy, classify_response
+from app.plugins.qqmsg.delivery.breaker import FAIL_OPEN, CircuitBreaker, CircuitOpenError
+from app.plugins.qqmsg.delivery.ws import OneBotWebSocket
+from app.plugins.qqmsg.delivery.imagecache import ImageCache
+from app.plugins.qqmsg.delivery.target import SEND_TYPES, Target, parse_targets
+from app.plugins.qqmsg.delivery.router import Router
+from app.plugins.qqmsg.delivery.metrics import Histogram, Metrics
+from app.plugins.qqmsg.delivery.payload import PayloadBuilder
+from app.plugins.qqmsg.delivery.segments import MAX_FORWARD_NODES, MessageBuilder, forward_nodes, node
+from app.plugins.qqmsg.delivery.journal import Journal
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+from app.log import logger
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class AsyncTransport:
+    """
+    在独立事件循环线程上运行的异步HTTP客户端，大量并发发送复用同一个事件循环和连接池
+    """
+
+    def __init__(self, pool_size: int = 10, timeout: float = 20):
+        """
+        :param pool_size: 最大连接数
+        :param timeout: 请求超时秒数
+        """
+        self._pool_size = max(int(pool_size or 0), 1)
+        self._timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._client = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available() -> bool:
+        """
+        是否安装了httpx
+        """
+        return httpx is not None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """
+        按需启动事件循环线程
+        """
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    ready = threading.Event()
+
+                    def run():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(ready.set)
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=run, name="qqmsg-aio", daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+        return self._loop
+
+    def in_loop(self) -> bool:
+        """
+        当前是否运行在本事件循环线程上
+        """
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def __client(self):
+        if self._client is None:
+            # 只在事件循环线程内创建，连接池等待不设超时，由上层控制并发
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self._timeout, pool=None),
+                limits=httpx.Limits(max_connections=self._pool_size,
+                                    max_keepalive_connections=self._pool_size),
+                verify=False)
+        return self._client
+
+    async def post(self, url: str, headers: dict = None, data: Any = None) -> Optional[Any]:
+        """
+        异步POST，连接失败返回None，与RequestUtils保持一致
+        """
+        try:
+            res = await self.__client().post(url, headers=headers, content=data)
+        except httpx.HTTPError as err:
+            logger.debug(f"异步请求失败：{url}，{str(err)}")
+            return None
+        # 兼容requests.Response的reason属性
+        res.reason = res.reason_phrase
+        return res
+
+    async def get(self, url: str, headers: dict = None, timeout: float = None) -> Optional[Any]:
+        try:
+            res = await self.__client().get(url, headers=headers, timeout=timeout or self._timeout)
+        except httpx.HTTPError as err:
+            logger.debug(f"异步请求失败：{url}，{str(err)}")
+            return None
+        res.reason = res.reason_phrase
+        return res
+
+    def submit(self, coro: Coroutine) -> Future:
+        """
+        提交协程到事件循环，立即返回Future
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Coroutine, timeout: float = None) -> Any:
+        """
+        同步门面：提交协程并等待结果，供事件处理等同步调用点使用
+        """
+        if self.in_loop():
+            raise RuntimeError("不能在事件循环线程内同步等待")
+        return self.submit(coro).result(timeout)
+
+    def close(self):
+        """
+        关闭客户端并停止事件循环线程
+        """
+        with self._lock:
+            loop, thread, client = self._loop, self._thread, self._client
+            self._loop, self._thread, self._client = None, None, None
+        if not loop:
+            return
+        if client is not None:
+            try:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(5)
+            except Exception as err:
+                logger.debug(f"关闭异步HTTP客户端失败：{str(err)}")
+        loop.call_soon_threadsafe(loop.stop)
+        if thread:
+            thread.join(5)
+        loop.close()
@@ -0,0 +1,166 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from app.log import logger
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 熔断期间被拒绝的发送
+FAIL_OPEN = "open"
+
+
+class CircuitOpenError(Exception):
+    """
+    熔断器打开时拒绝发送
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    bot地址熔断器：连续失败达到阈值后打开，打开期间直接拒绝发送；
+    到期后半开，有探测函数时由后台线程探测，否则放行一次试探请求
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30,
+                 probe: Callable[[], bool] = None, on_close: Callable[[], None] = None):
+        """
+        :param failure_threshold: 连续失败多少次后打开，0为不启用
+        :param reset_timeout: 打开后多少秒进入半开
+        :param probe: 健康探测函数，返回True表示bot已恢复
+        :param on_close: 熔断恢复后的回调
+        """
+        self._lock = threading.Lock()
+        self.probe = probe
+        self.on_close = on_close
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+        self._timer: Optional[threading.Timer] = None
+        # 统计
+        self._opened = 0
+        self._rejected = 0
+        self.failure_threshold = 0
+        self.reset_timeout = 1.0
+        self.configure(failure_threshold, reset_timeout)
+
+    def configure(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = max(int(failure_threshold or 0), 0)
+        self.reset_timeout = max(float(reset_timeout or 0), 1.0)
+        if not self.failure_threshold:
+            self.reset()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        是否允许发送
+        """
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return True
+            if self._state == STATE_OPEN and not self.probe \
+                    and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = STATE_HALF_OPEN
+            # 无探测函数时半开状态只放行一个试探请求
+            if self._state == STATE_HALF_OPEN and not self.probe and not self._trial:
+                self._trial = True
+                return True
+            self._rejected += 1
+            return False
+
+    def check(self):
+        """
+        不允许发送时抛出CircuitOpenError
+        """
+        if not self.allow():
+            raise CircuitOpenError(f"QQ消息发送地址熔断中（{self._state}），暂停发送")
+
+    def record_success(self):
+        with self._lock:
+            closed = self._state != STATE_CLOSED
+            self.__close()
+        if closed:
+            self.__notify_close()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == STATE_HALF_OPEN or (
+                    self._state == STATE_CLOSED
+                    and self.failure_threshold
+                    and self._failures >= self.failure_threshold):
+                self.__open()
+
+    def reset(self):
+        """
+        关闭熔断器并停止探测
+        """
+        with self._lock:
+            self.__close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self._state,
+            "failures": self._failures,
+            "threshold": self.failure_threshold,
+            "opened": self._opened,
+            "rejected": self._rejected,
+            "open_seconds": round(time.monotonic() - self._opened_at, 1) if self._state != STATE_CLOSED else 0,
+        }
+
+    def __open(self):
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._trial = False
+        self._opened += 1
+        logger.warn(f"QQ消息发送连续失败 {self._failures} 次，熔断 {self.reset_timeout:.0f} 秒")
+        if self.probe:
+            self.__schedule_probe()
+
+    def __close(self):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        self._state = STATE_CLOSED
+        self._failures = 0
+        self._trial = False
+
+    def __schedule_probe(self):
+        if self._timer:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.reset_timeout, self.__run_probe)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def __run_probe(self):
+        with self._lock:
+            if self._state != STATE_OPEN:
+                return
+            self._state = STATE_HALF_OPEN
+        try:
+            healthy = self.probe()
+        except Exception as err:
+            logger.debug(f"QQ消息发送地址探测异常：{str(err)}")
+            healthy = False
+        if healthy:
+            logger.info("QQ消息发送地址已恢复，关闭熔断")
+            self.record_success()
+        else:
+            with self._lock:
+                if self._state == STATE_HALF_OPEN:
+                    self.__open()
+
+    def __notify_close(self):
+        if not self.on_close:
+            return
+        try:
+            self.on_close()
+        except Exception as err:
+            logger.error(f"熔断恢复回调失败：{str(err)}")
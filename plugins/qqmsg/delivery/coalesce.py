@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, List
+
+from app.log import logger
+
+
+class Coalescer:
+    """
+    将同一key在时间窗口内到达的消息合并，窗口到期或数量达到上限时一次性输出
+    """
+
+    def __init__(self, window: float, flush: Callable[[Hashable, List[Any]], None], max_batch: int = 20):
+        """
+        :param window: 合并窗口（秒），从该key的第一条消息开始计时
+        :param flush: 输出回调，参数为key和该窗口内的全部消息
+        :param max_batch: 单个窗口最多合并的消息数
+        """
+        self._window = max(float(window or 0), 0)
+        self._flush = flush
+        self._max_batch = max(int(max_batch or 0), 1)
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, List[Any]] = {}
+        self._timers: Dict[Hashable, threading.Timer] = {}
+        # 统计
+        self._received = 0
+        self._emitted = 0
+
+    def add(self, key: Hashable, item: Any):
+        """
+        加入消息，窗口为0时直接输出
+        """
+        self._received += 1
+        if not self._window:
+            self.__emit(key, [item])
+            return
+        full = None
+        with self._lock:
+            items = self._pending.setdefault(key, [])
+            items.append(item)
+            if len(items) >= self._max_batch:
+                full = self.__pop(key)
+            elif key not in self._timers:
+                timer = threading.Timer(self._window, self.__expire, args=(key,))
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+        if full:
+            self.__emit(key, full)
+
+    def flush_all(self):
+        """
+        立即输出所有未到期的窗口
+        """
+        with self._lock:
+            batches = [(key, self.__pop(key)) for key in list(self._pending)]
+        for key, items in batches:
+            self.__emit(key, items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window": self._window,
+            "pending": sum(len(items) for items in self._pending.values()),
+            "received": self._received,
+            "emitted": self._emitted,
+        }
+
+    def __pop(self, key: Hashable) -> List[Any]:
+        timer = self._timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        return self._pending.pop(key, [])
+
+    def __expire(self, key: Hashable):
+        with self._lock:
+            self._timers.pop(key, None)
+            items = self._pending.pop(key, [])
+        if items:
+            self.__emit(key, items)
+
+    def __emit(self, key: Hashable, items: List[Any]):
+        self._emitted += 1
+        try:
+            self._flush(key, items)
+        except Exception as err:
+            logger.error(f"合并消息输出失败：{str(err)}")
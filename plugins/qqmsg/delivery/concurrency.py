@@ -0,0 +1,197 @@
+import math
+import threading
+import time
+from typing import Any, Dict
+
+from app.plugins.qqmsg.delivery.ratelimit import PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from app.plugins.qqmsg.delivery.waiters import LoopWaiters
+
+# 基线延迟向当前延迟漂移的时间窗口（秒），bot长期变慢时约一个窗口后以新延迟为基线
+BASELINE_WINDOW = 60
+
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制：按bot的响应延迟调整同时在途的请求数上限
+    延迟接近基线时每次响应增加约sqrt(上限)，延迟超过基线的容忍倍数时按比例收缩（梯度算法）；
+    请求失败、超时或bot返回非零retcode/status时乘性减小（AIMD），同一个延迟周期内只减一次
+    交互回复等待时优先放行，通知让位
+    """
+
+    def __init__(self, max_limit: int = 20, min_limit: int = 1, initial: int = 4,
+                 tolerance: float = 2.0, backoff: float = 0.7, smoothing: float = 0.2):
+        """
+        :param max_limit: 并发上限的最大值，0为不限制
+        :param min_limit: 并发上限的最小值
+        :param initial: 初始并发上限
+        :param tolerance: 短期延迟超过基线多少倍开始收缩
+        :param backoff: 失败时上限乘以该系数
+        :param smoothing: 上限调整的平滑系数
+        """
+        self._cond = threading.Condition()
+        self._loop_waiters = LoopWaiters()
+        self._tolerance = max(float(tolerance), 1.0)
+        self._backoff = min(max(float(backoff), 0.1), 0.95)
+        self._smoothing = min(max(float(smoothing), 0.01), 1.0)
+        self._max_limit = 0
+        self._min_limit = 1
+        self._limit = float(initial)
+        self._inflight = 0
+        # 等待中的交互回复数
+        self._urgent = 0
+        # 短期平滑延迟和基线延迟（秒）
+        self._rtt = 0.0
+        self._baseline = 0.0
+        self._baseline_at = 0.0
+        self._last_drop = 0.0
+        # 统计
+        self._waits = 0
+        self._drops = 0
+        self.configure(max_limit=max_limit, min_limit=min_limit)
+
+    def configure(self, max_limit: int = 20, min_limit: int = 1):
+        with self._cond:
+            self._max_limit = max(int(max_limit or 0), 0)
+            self._min_limit = max(int(min_limit or 0), 1)
+            if self._max_limit:
+                self._min_limit = min(self._min_limit, self._max_limit)
+                self._limit = min(max(self._limit, self._min_limit), self._max_limit)
+            self.__notify()
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_limit > 0
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit) if self._max_limit else 0
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def try_acquire(self, priority: int = PRIORITY_NORMAL) -> bool:
+        """
+        不等待地占用一个并发名额，未启用时直接返回True
+        """
+        if not self._max_limit:
+            return True
+        with self._cond:
+            if self.__blocked(priority):
+                return False
+            self._inflight += 1
+            return True
+
+    def acquire(self, priority: int = PRIORITY_NORMAL):
+        """
+        占用一个并发名额，达到上限时阻塞等待
+        """
+        if self.try_acquire(priority):
+            return
+        with self._cond:
+            self._waits += 1
+            urgent = priority <= PRIORITY_INTERACTIVE
+            if urgent:
+                self._urgent += 1
+            try:
+                while self.__blocked(priority):
+                    self._cond.wait()
+                self._inflight += 1
+            finally:
+                if urgent:
+                    self._urgent -= 1
+
+    async def acquire_async(self, priority: int = PRIORITY_NORMAL):
+        """
+        acquire的协程版本，在事件循环上等待名额，不占用线程
+        """
+        if self.try_acquire(priority):
+            return
+        urgent = priority <= PRIORITY_INTERACTIVE
+        with self._cond:
+            self._waits += 1
+            if urgent:
+                self._urgent += 1
+        try:
+            while True:
+                with self._cond:
+                    if not self.__blocked(priority):
+                        self._inflight += 1
+                        return
+                    waiter = self._loop_waiters.add()
+                try:
+                    await waiter
+                finally:
+                    with self._cond:
+                        self._loop_waiters.discard(waiter)
+        finally:
+            if urgent:
+                with self._cond:
+                    self._urgent -= 1
+                    # 交互回复取消等待时，让位的请求需要重新检查
+                    self.__notify()
+
+    def release(self, rtt: float, ok: bool = True):
+        """
+        释放名额并根据本次请求的延迟和结果调整上限
+        :param rtt: 请求耗时（秒），不含限流等待
+        :param ok: 请求是否成功，失败、超时、bot返回错误时为False
+        """
+        with self._cond:
+            self._inflight = max(self._inflight - 1, 0)
+            if self._max_limit:
+                if ok:
+                    self.__grow(rtt)
+                else:
+                    self.__drop()
+            self.__notify()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "max_limit": self._max_limit,
+            "inflight": self._inflight,
+            "rtt_ms": round(self._rtt * 1000, 1),
+            "baseline_ms": round(self._baseline * 1000, 1),
+            "waits": self._waits,
+            "drops": self._drops,
+        }
+
+    def __notify(self):
+        self._cond.notify_all()
+        self._loop_waiters.notify_all()
+
+    def __blocked(self, priority: int) -> bool:
+        if not self._max_limit:
+            return False
+        if self._inflight >= int(self._limit):
+            return True
+        # 有交互回复在等待时，其它请求让出空出的名额
+        return priority > PRIORITY_INTERACTIVE and self._urgent > 0
+
+    def __grow(self, rtt: float):
+        rtt = max(rtt, 0.0001)
+        self._rtt = rtt if not self._rtt else self._rtt + (rtt - self._rtt) * 0.2
+        # 基线跟随最低延迟，延迟长期升高时按时间缓慢上移，与请求量无关
+        now = time.monotonic()
+        if not self._baseline or rtt < self._baseline:
+            self._baseline = rtt
+        else:
+            self._baseline += (rtt - self._baseline) * min((now - self._baseline_at) / BASELINE_WINDOW, 1.0)
+        self._baseline_at = now
+        gradient = max(0.5, min(1.0, self._tolerance * self._baseline / self._rtt))
+        target = self._limit * gradient + math.sqrt(self._limit)
+        # 在途请求不到上限一半时负载不足，延迟说明不了上限是否合适，只收缩不增长
+        if target > self._limit and self._inflight + 1 < self._limit / 2:
+            return
+        limit = self._limit + (target - self._limit) * self._smoothing
+        self._limit = min(max(limit, self._min_limit), self._max_limit)
+
+    def __drop(self):
+        now = time.monotonic()
+        # 同一批并发请求同时失败只收缩一次
+        if now - self._last_drop < max(self._rtt, 0.1):
+            return
+        self._last_drop = now
+        self._drops += 1
+        self._limit = max(self._limit * self._backoff, self._min_limit)
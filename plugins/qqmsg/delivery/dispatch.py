@@ -0,0 +1,163 @@
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.log import logger
+
+# 工作线程空闲时检查停止信号的间隔（秒）
+WAIT_INTERVAL = 0.2
+
+
+class DeliveryQueue:
+    """
+    有界的后台投递队列，由固定数量的工作线程消费，事件线程只负责入队
+    """
+
+    def __init__(self, handler: Callable[[Any], None], maxsize: int = 1000, workers: int = 2,
+                 name: str = "qqmsg"):
+        """
+        :param handler: 消费函数，每条消息调用一次
+        :param maxsize: 队列容量，满了之后新消息直接丢弃
+        :param workers: 工作线程数
+        :param name: 线程名前缀
+        """
+        self._handler = handler
+        self._maxsize = max(int(maxsize or 0), 1)
+        self._workers_num = max(int(workers or 0), 1)
+        self._name = name
+        self._queue: Optional[queue.Queue] = None
+        self._workers: List[threading.Thread] = []
+        # 延迟入队（重试退避）的定时器
+        self._timers: Dict[threading.Timer, Any] = {}
+        self._lock = threading.Lock()
+        self._running = False
+        # 停止信号，每次启动新建，与该次启动的队列一起交给工作线程
+        self._stopping: Optional[threading.Event] = None
+        # 统计
+        self._enqueued = 0
+        self._processed = 0
+        self._failed = 0
+        self._dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    @property
+    def dropped(self) -> int:
+        return self._dropped
+
+    def start(self):
+        """
+        启动工作线程
+        """
+        with self._lock:
+            if self._running:
+                return
+            self._queue = queue.Queue(maxsize=self._maxsize)
+            self._stopping = threading.Event()
+            self._running = True
+            self._workers = []
+            for i in range(self._workers_num):
+                worker = threading.Thread(target=self.__run, args=(self._queue, self._stopping),
+                                          name=f"{self._name}-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def put(self, item: Any) -> bool:
+        """
+        非阻塞入队，队列已满或未启动时丢弃并计数
+        """
+        if not self._running:
+            self._dropped += 1
+            return False
+        try:
+            self._queue.put_nowait(item)
+            self._enqueued += 1
+            return True
+        except queue.Full:
+            self._dropped += 1
+            logger.warn(f"投递队列已满（{self._maxsize}），丢弃消息")
+            return False
+
+    def put_later(self, item: Any, delay: float):
+        """
+        延迟入队，等待期间不占用工作线程
+        """
+        if not self._running:
+            self._dropped += 1
+            return
+        timer = threading.Timer(delay, self.__fire, args=(None,))
+        timer.args = (timer,)
+        timer.daemon = True
+        with self._lock:
+            self._timers[timer] = item
+        timer.start()
+
+    def stop(self, timeout: float = 10) -> List[Any]:
+        """
+        停止队列：等待已入队消息在超时时间内发送完毕，再结束工作线程
+        :return: 未能发送的消息（含尚未到期的延迟消息）
+        """
+        with self._lock:
+            if not self._running:
+                return []
+            self._running = False
+            workers, self._workers = self._workers, []
+            timers, self._timers = self._timers, {}
+            for timer in timers:
+                timer.cancel()
+            # 工作线程发送完剩余消息、队列取空后自行退出；超时仍在处理的线程处理完当前消息后退出
+            self._stopping.set()
+        per_worker = timeout / max(len(workers), 1)
+        for worker in workers:
+            worker.join(per_worker)
+        leftover = list(timers.values())
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            leftover.append(item)
+        if leftover:
+            logger.warn(f"投递队列停止时仍有 {len(leftover)} 条消息未发送")
+        return leftover
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "depth": self.depth,
+            "capacity": self._maxsize,
+            "workers": len(self._workers),
+            "delayed": len(self._timers),
+            "enqueued": self._enqueued,
+            "processed": self._processed,
+            "failed": self._failed,
+            "dropped": self._dropped,
+        }
+
+    def __fire(self, timer: threading.Timer):
+        with self._lock:
+            item = self._timers.pop(timer, None)
+        if item is not None:
+            self.put(item)
+
+    def __run(self, items: queue.Queue, stopping: threading.Event):
+        while True:
+            try:
+                item = items.get(timeout=WAIT_INTERVAL)
+            except queue.Empty:
+                if stopping.is_set():
+                    return
+                continue
+            try:
+                self._handler(item)
+                self._processed += 1
+            except Exception as err:
+                self._failed += 1
+                logger.error(f"投递队列处理消息失败：{str(err)}")
+            finally:
+                items.task_done()
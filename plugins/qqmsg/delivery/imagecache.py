@@ -0,0 +1,173 @@
+import base64
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from app.log import logger
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class ImageCache:
+    """
+    本地内容寻址的图片缓存：同一海报只下载一次，按总大小LRU淘汰，可选缩成适合QQ的缩略图
+    """
+
+    def __init__(self, path: Path, fetch: Callable[[str], Optional[bytes]],
+                 max_bytes: int = 100 * 1024 * 1024, max_side: int = 1080):
+        """
+        :param path: 缓存目录
+        :param fetch: 下载函数，返回图片内容，失败返回None
+        :param max_bytes: 缓存总大小上限
+        :param max_side: 缩略图最长边像素，0为不缩放（需安装Pillow）
+        """
+        self._dir = Path(path)
+        self._index_file = self._dir / "index.json"
+        self._fetch = fetch
+        self._max_bytes = max(int(max_bytes or 0), 1024 * 1024)
+        self._max_side = max(int(max_side or 0), 0)
+        # 图片地址 -> 文件名
+        self._urls: Dict[str, str] = {}
+        # 文件名 -> 大小，按最近使用排序
+        self._files: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.__load()
+
+    def get(self, url: str) -> Optional[str]:
+        """
+        获取图片的base64://地址，下载失败返回None
+        """
+        data = self.get_bytes(url)
+        if not data:
+            return None
+        return "base64://" + base64.b64encode(data).decode()
+
+    def get_bytes(self, url: str) -> Optional[bytes]:
+        if not url or not url.startswith("http"):
+            return None
+        with self._lock:
+            name = self._urls.get(url)
+            if name and name in self._files:
+                self._files.move_to_end(name)
+            else:
+                name = None
+        if name:
+            try:
+                data = (self._dir / name).read_bytes()
+                self.hits += 1
+                return data
+            except OSError:
+                # 文件被外部删除，重新下载
+                with self._lock:
+                    self.__forget(name)
+        self.misses += 1
+        try:
+            raw = self._fetch(url)
+        except Exception as err:
+            logger.debug(f"下载图片失败：{url}，{str(err)}")
+            raw = None
+        if not raw:
+            self.errors += 1
+            return None
+        data = self.__shrink(raw)
+        name = hashlib.sha1(data).hexdigest() + ".img"
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            target = self._dir / name
+            if not target.exists():
+                tmp = target.with_suffix(".tmp")
+                tmp.write_bytes(data)
+                tmp.replace(target)
+        except OSError as err:
+            logger.warn(f"写入图片缓存失败：{str(err)}")
+            return data
+        with self._lock:
+            self._urls[url] = name
+            if name not in self._files:
+                self._files[name] = len(data)
+                self._total += len(data)
+            self._files.move_to_end(name)
+            self.__evict()
+            self.__save()
+        return data
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "files": len(self._files),
+            "bytes": self._total,
+            "max_bytes": self._max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+    def __shrink(self, raw: bytes) -> bytes:
+        """
+        超过最长边的图片缩放为JPEG缩略图，未安装Pillow或解码失败时保持原图
+        """
+        if not self._max_side or Image is None:
+            return raw
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                if max(img.size) <= self._max_side:
+                    return raw
+                img = img.convert("RGB")
+                img.thumbnail((self._max_side, self._max_side))
+                out = io.BytesIO()
+                img.save(out, format="JPEG", quality=85, optimize=True)
+                return out.getvalue()
+        except Exception as err:
+            logger.debug(f"生成缩略图失败：{str(err)}")
+            return raw
+
+    def __evict(self):
+        while self._total > self._max_bytes and len(self._files) > 1:
+            name, size = self._files.popitem(last=False)
+            self._total -= size
+            self._urls = {url: n for url, n in self._urls.items() if n != name}
+            try:
+                (self._dir / name).unlink()
+            except OSError:
+                pass
+
+    def __forget(self, name: str):
+        size = self._files.pop(name, 0)
+        self._total -= size
+        self._urls = {url: n for url, n in self._urls.items() if n != name}
+
+    def __load(self):
+        """
+        启动时按文件修改时间恢复LRU顺序，并读取地址索引
+        """
+        if not self._dir.exists():
+            return
+        files = sorted(self._dir.glob("*.img"), key=lambda f: f.stat().st_mtime)
+        for file in files:
+            size = file.stat().st_size
+            self._files[file.name] = size
+            self._total += size
+        try:
+            urls = json.loads(self._index_file.read_text(encoding="utf-8")) if self._index_file.exists() else {}
+        except (OSError, ValueError):
+            urls = {}
+        self._urls = {url: name for url, name in urls.items() if name in self._files}
+        self.__evict()
+
+    def __save(self):
+        try:
+            tmp = self._index_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._urls, ensure_ascii=False), encoding="utf-8")
+            tmp.replace(self._index_file)
+        except OSError as err:
+            logger.debug(f"保存图片缓存索引失败：{str(err)}")
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+SEGMENT_PREFIX = "journal-"
+SEGMENT_SUFFIX = ".log"
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class Journal:
+    """
+    出站消息的预写日志：消息入队前追加一条带幂等键的记录，送达或转入死信后追加确认记录，启动时重放未确认的消息
+    日志按大小切分为多个段文件，最早的段内消息全部确认后整段删除；段数过多时把旧段中未确认的消息搬到当前段再删除旧段
+    写入只进缓冲区，由后台线程按间隔批量fsync，进程崩溃最多丢失一个间隔内的记录；sync_interval为0时每条记录都fsync
+    """
+
+    def __init__(self, path: Path, segment_bytes: int = 4 * 1024 * 1024, sync_interval: float = 0.2,
+                 max_segments: int = 8):
+        """
+        :param path: 段文件所在目录
+        :param segment_bytes: 单个段文件的大小上限
+        :param sync_interval: 批量fsync的间隔（秒）
+        :param max_segments: 段文件数量超过该值时压缩
+        """
+        self._path = Path(path)
+        self._segment_bytes = max(int(segment_bytes or 0), 4096)
+        self._sync_interval = max(float(sync_interval or 0), 0)
+        self._max_segments = max(int(max_segments or 0), 2)
+        self._lock = threading.Lock()
+        # 未确认的消息：幂等键 -> (所在段序号, 消息)
+        self._pending: Dict[str, Tuple[int, dict]] = {}
+        # 每个段内未确认的消息数，按段序号递增排列
+        self._live: Dict[int, int] = {}
+        self._file = None
+        self._seq = 0
+        self._size = 0
+        self._dirty = False
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        # 统计
+        self._appended = 0
+        self._acked = 0
+        self._syncs = 0
+        self._rotations = 0
+        self._compactions = 0
+
+    def open(self) -> List[dict]:
+        """
+        读取全部段文件，未确认的消息重写到新段后删除旧段，启动后台刷盘
+        :return: 待重放的消息，keys字段为其幂等键
+        """
+        with self._lock:
+            self._path.mkdir(parents=True, exist_ok=True)
+            segments = self.__segments()
+            pending: Dict[str, dict] = {}
+            for _, file in segments:
+                for record in self.__read(file):
+                    if record.get("op") == "add":
+                        pending[record.get("key")] = record.get("item") or {}
+                    elif record.get("op") == "ack":
+                        pending.pop(record.get("key"), None)
+            self._seq = segments[-1][0] if segments else 0
+            self.__rotate()
+            for key, item in pending.items():
+                self.__add(key, item)
+            self.__sync()
+            for _, file in segments:
+                file.unlink()
+            self._stop.clear()
+            if self._sync_interval:
+                self._flusher = threading.Thread(target=self.__flush_loop, name="qqmsg-journal", daemon=True)
+                self._flusher.start()
+            return [{**item, "keys": [key]} for key, item in pending.items()]
+
+    def append(self, item: dict) -> Optional[str]:
+        """
+        记录一条待投递的消息
+        :return: 幂等键，日志未打开时返回None
+        """
+        key = uuid.uuid4().hex
+        with self._lock:
+            if not self._file:
+                return None
+            self.__add(key, item)
+            self._appended += 1
+            if not self._sync_interval:
+                self.__sync()
+            if self._size >= self._segment_bytes:
+                self.__rotate()
+        return key
+
+    def ack(self, keys: List[str]):
+        """
+        确认消息已送达或已转入死信，不再重放
+        """
+        with self._lock:
+            if not self._file:
+                return
+            acked = 0
+            for key in keys or ():
+                entry = self._pending.pop(key, None)
+                if not entry:
+                    continue
+                self.__write(_dumps({"op": "ack", "key": key}))
+                self._live[entry[0]] -= 1
+                acked += 1
+            if not acked:
+                return
+            self._acked += acked
+            if not self._sync_interval:
+                self.__sync()
+            self.__drop_acked()
+            if self._size >= self._segment_bytes:
+                self.__rotate()
+
+    def sync(self):
+        """
+        立即刷盘
+        """
+        with self._lock:
+            if self._file:
+                self.__sync()
+
+    def close(self):
+        """
+        停止后台刷盘并关闭当前段，未确认的消息留在日志中，下次打开时重放
+        """
+        self._stop.set()
+        if self._flusher:
+            self._flusher.join(5)
+            self._flusher = None
+        with self._lock:
+            if not self._file:
+                return
+            self.__sync()
+            self._file.close()
+            self._file = None
+            self._pending.clear()
+            self._live.clear()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "segments": len(self._live),
+            "appended": self._appended,
+            "acked": self._acked,
+            "syncs": self._syncs,
+            "rotations": self._rotations,
+            "compactions": self._compactions,
+        }
+
+    def __segment(self, seq: int) -> Path:
+        return self._path / f"{SEGMENT_PREFIX}{seq:08d}{SEGMENT_SUFFIX}"
+
+    def __segments(self) -> List[Tuple[int, Path]]:
+        segments = []
+        for file in self._path.glob(f"{SEGMENT_PREFIX}*{SEGMENT_SUFFIX}"):
+            try:
+                segments.append((int(file.name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]), file))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    @staticmethod
+    def __read(file: Path) -> List[dict]:
+        records = []
+        with file.open("rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 崩溃时写了一半的记录，跳过
+                    continue
+        return records
+
+    def __add(self, key: str, item: dict):
+        self.__write(_dumps({"op": "add", "key": key, "item": item}))
+        self._pending[key] = (self._seq, item)
+        self._live[self._seq] += 1
+
+    def __write(self, data: bytes):
+        self._file.write(data)
+        self._size += len(data)
+        self._dirty = True
+
+    def __sync(self):
+        if not self._dirty:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+        self._syncs += 1
+
+    def __rotate(self):
+        """
+        当前段写满，刷盘后切换到新段，段数过多时压缩
+        """
+        if self._file:
+            self.__sync()
+            self._file.close()
+            self._rotations += 1
+        self._seq += 1
+        self._file = self.__segment(self._seq).open("ab")
+        self._size = 0
+        self._live[self._seq] = 0
+        self.__drop_acked()
+        if len(self._live) > self._max_segments:
+            self.__compact()
+
+    def __drop_acked(self):
+        """
+        从最早的段开始删除已全部确认的段；只删除前缀，保证确认记录不会早于对应的消息记录被删除
+        """
+        for seq in list(self._live):
+            if seq == self._seq or self._live[seq]:
+                break
+            del self._live[seq]
+            self.__segment(seq).unlink(missing_ok=True)
+
+    def __compact(self):
+        """
+        把旧段中未确认的消息以相同幂等键重写到当前段，刷盘后删除旧段；重放时按幂等键去重
+        """
+        for key, (seq, item) in list(self._pending.items()):
+            if seq != self._seq:
+                self._live[seq] -= 1
+                self.__add(key, item)
+        self.__sync()
+        self.__drop_acked()
+        self._compactions += 1
+
+    def __flush_loop(self):
+        while not self._stop.wait(self._sync_interval):
+            try:
+                self.sync()
+            except OSError:
+                # 磁盘暂时不可写时下个间隔重试
+                continue
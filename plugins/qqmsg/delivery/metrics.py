@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence
+
+# 延迟分桶上限（毫秒），固定分桶记录开销为一次二分查找
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+# 每个计数器最多区分的标签数，超出的归入other，避免按用户计数时无限增长
+MAX_LABELS = 256
+
+
+class Histogram:
+    """
+    固定分桶的延迟直方图，分位数取所在分桶的上限
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self._buckets = tuple(buckets)
+        # 最后一个为溢出桶
+        self._counts = [0] * (len(self._buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self._buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= rank:
+                return self._buckets[index] if index < len(self._buckets) else self.max
+        return self.max
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 1) if self.count else 0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": round(self.max, 1),
+        }
+
+
+class Counter:
+    """
+    按消息类型和目标细分的计数器
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.by_type: Dict[str, int] = {}
+        self.by_target: Dict[str, int] = {}
+
+    def incr(self, mtype: Optional[str] = None, target: Optional[str] = None, value: int = 1):
+        self.total += value
+        if mtype is not None:
+            self.__add(self.by_type, mtype, value)
+        if target is not None:
+            self.__add(self.by_target, target, value)
+
+    @staticmethod
+    def __add(counts: Dict[str, int], label: str, value: int):
+        if label not in counts and len(counts) >= MAX_LABELS:
+            label = "other"
+        counts[label] = counts.get(label, 0) + value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "by_type": dict(self.by_type),
+            "by_target": dict(self.by_target),
+        }
+
+
+class Metrics:
+    """
+    插件与QQ模块共享的投递指标：发送、失败、重试、丢弃等计数和发送延迟直方图
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        # 瞬时值，查询统计时才读取
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._started = time.time()
+
+    def incr(self, name: str, mtype: Optional[str] = None, target: Optional[str] = None, value: int = 1):
+        """
+        计数加一
+        :param name: 指标名，如sent、failed、retried、dropped
+        :param mtype: 消息类型
+        :param target: 发送目标
+        """
+        with self._lock:
+            counter = self._counters.get(name)
+            if counter is None:
+                counter = self._counters[name] = Counter()
+            counter.incr(mtype, target, value)
+
+    def observe(self, name: str, seconds: float):
+        """
+        记录一次耗时
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds * 1000)
+
+    def gauge(self, name: str, read: Callable[[], Any]):
+        """
+        登记一个瞬时值，如当前并发上限
+        """
+        with self._lock:
+            self._gauges[name] = read
+
+    def value(self, name: str) -> Any:
+        read = self._gauges.get(name)
+        return read() if read else None
+
+    def count(self, name: str) -> int:
+        counter = self._counters.get(name)
+        return counter.total if counter else 0
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._started = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "since": int(self._started),
+                "counters": {name: counter.stats() for name, counter in self._counters.items()},
+                "latency_ms": {name: histogram.stats() for name, histogram in self._histograms.items()},
+                "gauges": {name: read() for name, read in self._gauges.items()},
+            }
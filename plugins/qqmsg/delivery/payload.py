@@ -0,0 +1,72 @@
+import gzip
+import json
+from typing import Any, Dict, List, Tuple
+
+try:
+    import orjson
+
+    def _dumps(obj: Any) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+ONEBOT_TYPES = ("send_private_msg", "send_group_msg")
+
+
+class PayloadBuilder:
+    """
+    单个目标的请求模板：地址、请求头和请求体的固定部分在配置时算好，发送时只编码变化的字段
+    OneBot以JSON发送消息段数组，私聊只带user_id，群聊只带group_id；fastapi bot的请求体格式由bot决定，保留原有字段
+    """
+    __slots__ = ("url", "send_type", "number", "fastapi", "headers", "_gzip_headers",
+                 "_gzip_min", "_target_key", "_prefix")
+
+    def __init__(self, url: str, send_type: str, number: Any, token: str = None, gzip_min: int = 0):
+        """
+        :param url: 完整的请求地址
+        :param send_type: 发送方式
+        :param number: 目标QQ号或群号
+        :param token: bot的access_token
+        :param gzip_min: fastapi请求体超过该字节数时gzip压缩，0为不压缩（bot需支持解压请求体）
+        """
+        self.url = url
+        self.send_type = send_type
+        self.number = number
+        self.fastapi = send_type not in ONEBOT_TYPES
+        self._gzip_min = max(int(gzip_min or 0), 0)
+        headers = {'content-type': 'application/json'}
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        self.headers = headers
+        self._gzip_headers = {**headers, 'Content-Encoding': 'gzip'}
+        self._target_key = "group_id" if send_type == "send_group_msg" else "user_id"
+        if self.fastapi:
+            # 去掉结尾的}，发送时直接拼接动态字段
+            self._prefix = _dumps({"user_id": number, "group_id": number})[:-1] + b","
+        else:
+            self._prefix = _dumps({self._target_key: number})[:-1] + b',"message":'
+
+    def onebot(self, message: List[Dict[str, Any]]) -> Tuple[Dict[str, str], bytes]:
+        """
+        OneBot HTTP请求头和JSON请求体
+        :param message: 消息段数组
+        """
+        return self.headers, self._prefix + _dumps(message) + b"}"
+
+    def params(self, message: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        OneBot动作参数，用于WebSocket
+        """
+        return {self._target_key: self.number, "message": message}
+
+    def fastapi_body(self, user: Any = "", title: str = "", image: str = "",
+                     text: str = "") -> Tuple[Dict[str, str], bytes]:
+        """
+        fastapi bot请求头和JSON请求体，超过阈值时压缩
+        """
+        body = self._prefix + _dumps({"user": user, "title": title, "image": image, "text": text})[1:]
+        if self._gzip_min and len(body) > self._gzip_min:
+            return self._gzip_headers, gzip.compress(body, compresslevel=5)
+        return self.headers, body
+
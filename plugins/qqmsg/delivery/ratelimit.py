@@ -0,0 +1,194 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.plugins.qqmsg.delivery.waiters import LoopWaiters
+
+# 优先级，数值越小越优先
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+# 批量类通知，发送时让位于交互回复和其它通知
+BULK_TYPES = {"Download", "Organize", "Subscribe", "MediaServer"}
+
+
+def priority_of(mtype: str = None) -> int:
+    """
+    根据NotificationType名称确定发送优先级
+    """
+    return PRIORITY_BULK if mtype in BULK_TYPES else PRIORITY_NORMAL
+
+
+def lane_of(send_type: str, number: Any) -> str:
+    """
+    根据发送方式和目标号码确定限流通道，私聊与群聊分开计数
+    """
+    if send_type == "send_group_msg":
+        return f"group:{number}"
+    if send_type == "send_private_msg":
+        return f"private:{number}"
+    return f"{send_type}:{number}"
+
+
+class TokenBucket:
+    """
+    令牌桶，由RateLimiter加锁调用
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 桶容量，即允许的突发条数
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.stamp = time.monotonic()
+
+    def take(self) -> float:
+        """
+        尝试取一个令牌，成功返回0，否则返回需要等待的秒数
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    按通道限流，同一通道内按优先级排队，高优先级（交互回复）先拿到令牌
+    """
+
+    def __init__(self, per_minute: int = 0, burst: int = 5):
+        """
+        :param per_minute: 每个通道每分钟最多发送条数，0为不限制
+        :param burst: 允许的突发条数
+        """
+        self._cond = threading.Condition()
+        self._loop_waiters = LoopWaiters()
+        self._counter = itertools.count()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._waiters: Dict[str, List[Tuple[int, int]]] = {}
+        # 等待统计：优先级 -> [次数, 总等待秒数, 最大等待秒数]
+        self._waits: Dict[int, List[float]] = {}
+        self._per_minute = 0
+        self._burst = 1
+        self.configure(per_minute, burst)
+
+    def configure(self, per_minute: int = 0, burst: int = 5):
+        with self._cond:
+            self._per_minute = max(int(per_minute or 0), 0)
+            self._burst = max(int(burst or 0), 1)
+            self._buckets.clear()
+            self.__notify()
+
+    @property
+    def enabled(self) -> bool:
+        return self._per_minute > 0
+
+    def acquire(self, lane: str, priority: int = PRIORITY_NORMAL) -> float:
+        """
+        阻塞直到该通道有可用令牌，返回等待的秒数
+        """
+        if not self.enabled:
+            return 0
+        start = time.monotonic()
+        with self._cond:
+            waiters, ticket = self.__enter(lane, priority)
+            try:
+                while True:
+                    delay = self.__ready(lane, waiters, ticket)
+                    if delay == 0:
+                        break
+                    self._cond.wait(delay)
+            finally:
+                self.__leave(lane, waiters, ticket)
+            return self.__record(priority, time.monotonic() - start)
+
+    async def acquire_async(self, lane: str, priority: int = PRIORITY_NORMAL) -> float:
+        """
+        acquire的协程版本，在事件循环上等待令牌，不占用线程
+        """
+        if not self.enabled:
+            return 0
+        start = time.monotonic()
+        with self._cond:
+            waiters, ticket = self.__enter(lane, priority)
+        try:
+            while True:
+                with self._cond:
+                    delay = self.__ready(lane, waiters, ticket)
+                    if delay == 0:
+                        break
+                    waiter = self._loop_waiters.add()
+                try:
+                    await asyncio.wait({waiter}, timeout=delay)
+                finally:
+                    with self._cond:
+                        self._loop_waiters.discard(waiter)
+        finally:
+            with self._cond:
+                self.__leave(lane, waiters, ticket)
+        with self._cond:
+            return self.__record(priority, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "per_minute": self._per_minute,
+                "burst": self._burst,
+                "waiting": sum(len(w) for w in self._waiters.values()),
+                "wait": {
+                    str(priority): {
+                        "count": int(count),
+                        "total_ms": round(total * 1000, 1),
+                        "avg_ms": round(total * 1000 / count, 1) if count else 0,
+                        "max_ms": round(peak * 1000, 1),
+                    } for priority, (count, total, peak) in self._waits.items()
+                }
+            }
+
+    def __enter(self, lane: str, priority: int) -> Tuple[List[Tuple[int, int]], Tuple[int, int]]:
+        waiters = self._waiters.setdefault(lane, [])
+        ticket = (priority, next(self._counter))
+        heapq.heappush(waiters, ticket)
+        return waiters, ticket
+
+    def __ready(self, lane: str, waiters: List[Tuple[int, int]], ticket: Tuple[int, int]) -> Optional[float]:
+        """
+        轮到该请求时取令牌，返回0表示可以发送，否则返回需要等待的秒数，未轮到时返回None
+        """
+        if not self.enabled:
+            return 0
+        if waiters[0] != ticket:
+            return None
+        bucket = self._buckets.get(lane)
+        if bucket is None:
+            bucket = self._buckets[lane] = TokenBucket(self._per_minute / 60, self._burst)
+        return bucket.take()
+
+    def __leave(self, lane: str, waiters: List[Tuple[int, int]], ticket: Tuple[int, int]):
+        waiters.remove(ticket)
+        heapq.heapify(waiters)
+        if not waiters:
+            self._waiters.pop(lane, None)
+        self.__notify()
+
+    def __record(self, priority: int, waited: float) -> float:
+        stat = self._waits.setdefault(priority, [0, 0.0, 0.0])
+        stat[0] += 1
+        stat[1] += waited
+        stat[2] = max(stat[2], waited)
+        return waited
+
+    def __notify(self):
+        self._cond.notify_all()
+        self._loop_waiters.notify_all()
@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from requests import Response
+
+from app.log import logger
+
+# 失败分类：连接错误、超时、5xx、429，可按退避重试
+FAIL_TRANSIENT = "transient"
+# bot已收到请求但返回retcode/status非0，只做有限重试
+FAIL_REJECTED = "rejected"
+# 4xx等请求本身的问题，重试无意义
+FAIL_FATAL = "fatal"
+
+
+def classify_response(res: Optional[Response]) -> Optional[str]:
+    """
+    根据HTTP响应判断失败类型，HTTP层面成功时返回None，由调用方继续检查返回码
+    """
+    if res is None:
+        return FAIL_TRANSIENT
+    if res.status_code == 429 or res.status_code >= 500:
+        return FAIL_TRANSIENT
+    if res.status_code >= 400:
+        return FAIL_FATAL
+    return None
+
+
+class RetryPolicy:
+    """
+    分类重试策略，退避时间为指数增长并带随机抖动
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 2, max_delay: float = 60,
+                 rejected_retries: int = 1):
+        """
+        :param max_retries: 可重试错误的最大重试次数
+        :param base_delay: 首次重试的基础等待秒数
+        :param max_delay: 单次等待上限
+        :param rejected_retries: bot返回失败时的最大重试次数
+        """
+        self.max_retries = max(int(max_retries or 0), 0)
+        self.base_delay = max(float(base_delay or 0), 0.1)
+        self.max_delay = max(float(max_delay or 0), self.base_delay)
+        self.rejected_retries = min(max(int(rejected_retries or 0), 0), self.max_retries)
+
+    def next_delay(self, fail: str, attempt: int) -> Optional[float]:
+        """
+        计算第attempt次失败后的等待秒数，不再重试时返回None
+        """
+        if fail == FAIL_TRANSIENT:
+            limit = self.max_retries
+        elif fail == FAIL_REJECTED:
+            limit = self.rejected_retries
+        else:
+            return None
+        if attempt >= limit:
+            return None
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        # 一半固定一半随机，避免bot恢复时所有重试同时到达
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+class DeadLetterStore:
+    """
+    追加写的死信文件，每行一条JSON记录，超过上限时压缩保留最新的记录
+    """
+
+    def __init__(self, path: Path, max_records: int = 1000):
+        self._path = Path(path)
+        self._max_records = max(int(max_records or 0), 1)
+        self._lock = threading.Lock()
+        self._count = None
+
+    @property
+    def count(self) -> int:
+        with self._lock:
+            return self.__count()
+
+    def append(self, item: Dict[str, Any], reason: str = ""):
+        """
+        记录一条发送失败的消息
+        """
+        self.extend([item], reason=reason)
+
+    def extend(self, items: List[Dict[str, Any]], reason: str = ""):
+        if not items:
+            return
+        now = int(time.time())
+        lines = "".join(json.dumps({**item, "ts": item.get("ts") or now, "reason": reason or item.get("reason", "")},
+                                   ensure_ascii=False, separators=(",", ":")) + "\n"
+                        for item in items)
+        with self._lock:
+            try:
+                count = self.__count()
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                with self._path.open("a", encoding="utf-8") as f:
+                    f.write(lines)
+                self._count = count + len(items)
+                # 超出两成再压缩，避免每次追加都重写文件
+                if self._count > self._max_records + self._max_records // 5:
+                    self.__compact()
+            except Exception as err:
+                logger.error(f"写入QQ消息死信文件失败：{str(err)}")
+
+    def peek(self) -> Optional[Dict[str, Any]]:
+        """
+        最早的一条记录，不从文件中移除
+        """
+        with self._lock:
+            records = self.__read()
+            return records[0] if records else None
+
+    def drain(self, handler: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]]) -> int:
+        """
+        持锁把全部记录交给handler处理，handler返回仍需保留的记录并写回文件；
+        handler抛出异常时文件保持不变，处理完成前记录不会丢失
+        :return: 移出的记录数
+        """
+        with self._lock:
+            records = self.__read()
+            if not records:
+                return 0
+            remain = handler(records)
+            try:
+                if remain:
+                    self.__write_all(remain)
+                elif self._path.exists():
+                    self._path.unlink()
+            except Exception as err:
+                logger.error(f"清理QQ消息死信文件失败：{str(err)}")
+            self._count = len(remain)
+            return len(records) - len(remain)
+
+    def __read(self) -> List[Dict[str, Any]]:
+        if not self._path.exists():
+            return []
+        records = []
+        with self._path.open("r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 进程中断可能留下半行，跳过
+                    continue
+        return records
+
+    def __count(self) -> int:
+        if self._count is None:
+            self._count = len(self.__read())
+        return self._count
+
+    def __compact(self):
+        records = self.__read()[-self._max_records:]
+        self.__write_all(records)
+        self._count = len(records)
+        logger.warn(f"QQ消息死信超过 {self._max_records} 条，已丢弃最早的记录")
+
+    def __write_all(self, records: List[Dict[str, Any]]):
+        """
+        用给定记录替换文件内容，先写临时文件再替换
+        """
+        tmp = self._path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        tmp.replace(self._path)
@@ -0,0 +1,46 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.plugins.qqmsg.delivery.target import Target
+
+
+class Router:
+    """
+    预编译的路由表：消息类型 -> 接收的目标，初始化时一次建好，之后只读
+    配置变化时整体新建一个Router替换，发送线程不会看到建了一半的表
+    """
+
+    def __init__(self, targets: Iterable[Target], mtypes: Iterable[str] = ()):
+        """
+        :param targets: 所有发送目标
+        :param mtypes: 已知的NotificationType名称，预先为每种类型建好路由
+        """
+        self._targets: Tuple[Target, ...] = tuple(targets)
+        # 类型 -> (无标题过滤的目标, 有标题过滤的目标)
+        self._table: Dict[Optional[str], Tuple[Tuple[Target, ...], Tuple[Target, ...]]] = {
+            mtype: self.__plan(mtype) for mtype in (None, *mtypes)
+        }
+
+    @property
+    def targets(self) -> Tuple[Target, ...]:
+        return self._targets
+
+    def resolve(self, mtype: Optional[str], title: str = None) -> List[Target]:
+        """
+        查找消息应发送的目标，只有配置了标题过滤的目标才需要匹配标题
+        """
+        plan = self._table.get(mtype)
+        if plan is None:
+            # 未知类型（新版本新增的类型）临时计算，不写入只读的路由表
+            plan = self.__plan(mtype)
+        always, filtered = plan
+        if not filtered:
+            return list(always)
+        return [*always, *(target for target in filtered if target.accepts_title(title))]
+
+    def __plan(self, mtype: Optional[str]) -> Tuple[Tuple[Target, ...], Tuple[Target, ...]]:
+        accepted = [target for target in self._targets if target.accepts(mtype)]
+        return tuple(target for target in accepted if not target.title_filter), \
+            tuple(target for target in accepted if target.title_filter)
+
+    def __len__(self):
+        return len(self._targets)
@@ -0,0 +1,80 @@
+import re
+from typing import Any, Dict, Iterable, List
+
+# 单条合并转发消息最多的节点数
+MAX_FORWARD_NODES = 99
+
+_LINK = re.compile(r"\[([^\]\n]*)\]\((\S+?)\)")
+_EMPHASIS = re.compile(r"(?<![\w*])([*_])([^*_\n]+?)\1(?![\w*])")
+
+
+class MessageBuilder:
+    """
+    OneBot v11 消息段构建：文本、图片、链接，相邻文本段自动合并
+    QQ不渲染markdown，markdown()把列表文本中的 *标题*、_说明_、[文本](链接) 转为纯文本和链接
+    """
+    __slots__ = ("_segments",)
+
+    def __init__(self):
+        self._segments: List[Dict[str, Any]] = []
+
+    def text(self, data: str) -> "MessageBuilder":
+        if not data:
+            return self
+        if self._segments and self._segments[-1]["type"] == "text":
+            self._segments[-1]["data"]["text"] += data
+        else:
+            self._segments.append({"type": "text", "data": {"text": data}})
+        return self
+
+    def image(self, file: str) -> "MessageBuilder":
+        """
+        :param file: 图片地址或 base64:// 内容，为空时忽略
+        """
+        if file:
+            self._segments.append({"type": "image", "data": {"file": file}})
+            # 图片与文字分行显示
+            self.text("\n")
+        return self
+
+    def link(self, title: str, url: str) -> "MessageBuilder":
+        """
+        链接以“标题 地址”的文本发送，QQ会自动识别地址（分享卡片多数bot已不支持）
+        """
+        return self.text(f"{title} {url}" if title else url)
+
+    def markdown(self, data: str) -> "MessageBuilder":
+        if not data:
+            return self
+        pos = 0
+        for match in _LINK.finditer(data):
+            self.text(_EMPHASIS.sub(r"\2", data[pos:match.start()]))
+            self.link(match.group(1), match.group(2))
+            pos = match.end()
+        return self.text(_EMPHASIS.sub(r"\2", data[pos:]))
+
+    def build(self) -> List[Dict[str, Any]]:
+        return self._segments
+
+    def __bool__(self):
+        return bool(self._segments)
+
+
+def node(name: str, uin: Any, content: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    合并转发消息的一个自定义节点
+    """
+    return {"type": "node", "data": {"name": name, "uin": str(uin), "content": content}}
+
+
+def forward_nodes(header: str, lines: Iterable[str], image: str = "", name: str = "MoviePilot",
+                  uin: Any = 0, max_nodes: int = MAX_FORWARD_NODES) -> List[Dict[str, Any]]:
+    """
+    将列表组装为合并转发节点：首个节点为图片和标题，之后每条一个节点，超过节点上限时多条合并为一个节点
+    """
+    lines = list(lines)
+    per_node = max(-(-len(lines) // max(max_nodes - 1, 1)), 1)
+    nodes = [node(name, uin, MessageBuilder().image(image).markdown(header).build())]
+    for start in range(0, len(lines), per_node):
+        nodes.append(node(name, uin, MessageBuilder().markdown("\n".join(lines[start:start + per_node])).build()))
+    return nodes
@@ -0,0 +1,94 @@
+import re
+from typing import Any, FrozenSet, Iterable, List, Optional, Pattern
+
+from app.log import logger
+
+# 支持的发送方式
+SEND_TYPES = ("send_private_msg", "send_group_msg", "send_fastapi_msg")
+
+
+class Target:
+    """
+    一个消息发送目标：发送方式、QQ号或群号，以及该目标接收的消息类型和标题过滤规则
+    """
+    __slots__ = ("send_type", "number", "msgtypes", "excludes", "title_filter", "title_exclude")
+
+    def __init__(self, send_type: str, number: Any, msgtypes: Iterable[str] = None,
+                 title_filter: Pattern = None, title_exclude: bool = False):
+        """
+        :param send_type: 发送方式
+        :param number: 私聊为QQ号，群聊为群号
+        :param msgtypes: NotificationType名称，为空时接收全部类型，!开头的为排除的类型
+        :param title_filter: 标题正则，为空时不过滤
+        :param title_exclude: 为True时丢弃标题匹配的消息，否则只发送标题匹配的消息
+        """
+        self.send_type = send_type
+        self.number = str(number)
+        msgtypes = list(msgtypes or ())
+        self.msgtypes: FrozenSet[str] = frozenset(mtype for mtype in msgtypes if not mtype.startswith("!"))
+        self.excludes: FrozenSet[str] = frozenset(mtype[1:] for mtype in msgtypes if mtype.startswith("!"))
+        self.title_filter = title_filter
+        self.title_exclude = title_exclude
+
+    @property
+    def key(self) -> tuple:
+        return self.send_type, self.number
+
+    def accepts(self, mtype: Optional[str]) -> bool:
+        """
+        该目标是否接收此类型的消息，无类型的消息总是接收
+        """
+        if not mtype:
+            return True
+        if mtype in self.excludes:
+            return False
+        return not self.msgtypes or mtype in self.msgtypes
+
+    def accepts_title(self, title: Optional[str]) -> bool:
+        """
+        标题是否通过过滤规则
+        """
+        if not self.title_filter:
+            return True
+        return bool(self.title_filter.search(title or "")) != self.title_exclude
+
+    def __eq__(self, other):
+        return isinstance(other, Target) and self.key == other.key \
+            and self.msgtypes == other.msgtypes and self.excludes == other.excludes
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Target({self.send_type}:{self.number})"
+
+
+def parse_targets(text: str) -> List[Target]:
+    """
+    解析多目标配置，每行一个：发送方式:号码[:消息类型1,!消息类型2[:标题正则]]，#开头为注释
+    消息类型前加!表示排除，标题正则前加!表示丢弃匹配的消息，相同发送方式和号码只保留第一个
+    """
+    targets, keys = [], set()
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = [part.strip() for part in line.split(":", 3)]
+        if len(parts) < 2 or parts[0] not in SEND_TYPES or not parts[1]:
+            logger.warn(f"QQ消息目标配置错误，已忽略：{line}")
+            continue
+        msgtypes = [mtype.strip() for mtype in parts[2].split(",") if mtype.strip()] if len(parts) > 2 else []
+        title_filter, title_exclude = None, False
+        if len(parts) > 3 and parts[3]:
+            title_exclude = parts[3].startswith("!")
+            try:
+                title_filter = re.compile(parts[3][1:] if title_exclude else parts[3])
+            except re.error as err:
+                logger.warn(f"QQ消息目标标题正则错误，已忽略：{line}，{str(err)}")
+                continue
+        target = Target(parts[0], parts[1], msgtypes, title_filter=title_filter, title_exclude=title_exclude)
+        if target.key in keys:
+            continue
+        keys.add(target.key)
+        targets.append(target)
+    return targets
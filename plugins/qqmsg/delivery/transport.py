@@ -0,0 +1,247 @@
+import threading
+import time
+from typing import Any, Optional
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+
+from app.log import logger
+from app.plugins.qqmsg.delivery.aio import AsyncTransport
+from app.plugins.qqmsg.delivery.breaker import CircuitBreaker
+from app.plugins.qqmsg.delivery.concurrency import AdaptiveLimiter
+from app.plugins.qqmsg.delivery.imagecache import ImageCache
+from app.plugins.qqmsg.delivery.metrics import Metrics
+from app.plugins.qqmsg.delivery.ratelimit import PRIORITY_NORMAL, RateLimiter
+from app.plugins.qqmsg.delivery.ws import OneBotWebSocket
+from app.utils.http import RequestUtils
+
+
+class Transport:
+    """
+    插件与QQ模块共享的HTTP发送通道，使用长连接池避免每条消息重新握手
+    """
+
+    def __init__(self, pool_size: int = 10, pool_hosts: int = 4, rate_limit: int = 0, rate_burst: int = 5,
+                 max_concurrency: int = 20):
+        """
+        :param pool_size: 每个主机保持的最大连接数
+        :param pool_hosts: 连接池缓存的主机数
+        :param rate_limit: 每个目标每分钟最多发送条数，0为不限制
+        :param rate_burst: 限流允许的突发条数
+        :param max_concurrency: 自适应并发上限的最大值，0为不限制
+        """
+        self._pool_size = max(int(pool_size or 0), 1)
+        self._pool_hosts = max(int(pool_hosts or 0), 1)
+        self._session: Optional[Session] = None
+        self._lock = threading.Lock()
+        self.limiter = RateLimiter(per_minute=rate_limit, burst=rate_burst)
+        self.breaker = CircuitBreaker()
+        # 按bot响应延迟和返回码自适应调整的在途请求上限，HTTP和WebSocket共用
+        self.concurrency = AdaptiveLimiter(max_limit=max_concurrency)
+        # 熔断后的健康探测地址
+        self._probe_url = None
+        self._probe_headers = None
+        # 异步发送通道
+        self._aio: Optional[AsyncTransport] = None
+        # OneBot WebSocket长连接，设置后OneBot动作改走WebSocket
+        self.ws: Optional[OneBotWebSocket] = None
+        # 本地图片缓存，设置后图片以base64发给bot
+        self.images: Optional[ImageCache] = None
+        # 投递指标，随连接池长期存在，插件重新初始化不清零
+        self.metrics = Metrics()
+        self.metrics.gauge("concurrency_limit", lambda: self.concurrency.limit)
+        self.metrics.gauge("concurrency_inflight", lambda: self.concurrency.inflight)
+
+    def configure(self, pool_size: int = None, pool_hosts: int = None,
+                  rate_limit: int = None, rate_burst: int = None,
+                  breaker_threshold: int = None, breaker_timeout: float = None,
+                  probe_url: str = None, probe_headers: dict = None, async_mode: bool = None,
+                  max_concurrency: int = None):
+        """
+        调整连接池、限流、熔断和并发参数，连接池参数变化时重建连接池
+        """
+        if max_concurrency is not None:
+            self.concurrency.configure(max_limit=max_concurrency)
+        if rate_limit is not None:
+            self.limiter.configure(per_minute=rate_limit, burst=rate_burst)
+        if breaker_threshold is not None:
+            self.breaker.configure(failure_threshold=breaker_threshold, reset_timeout=breaker_timeout)
+        if probe_url is not None:
+            self._probe_url, self._probe_headers = probe_url, probe_headers
+            # 没有探测地址时，半开状态放行一次真实请求作为试探
+            self.breaker.probe = self.__probe if probe_url else None
+        if async_mode is not None:
+            if async_mode and not AsyncTransport.available():
+                logger.warn("未安装httpx，无法启用异步发送，继续使用同步连接池")
+                async_mode = False
+            if not async_mode and self._aio:
+                self._aio.close()
+                self._aio = None
+            elif async_mode and not self._aio:
+                self._aio = AsyncTransport(pool_size=pool_size or self._pool_size)
+        pool_size = max(int(pool_size or self._pool_size), 1)
+        pool_hosts = max(int(pool_hosts or self._pool_hosts), 1)
+        if pool_size == self._pool_size and pool_hosts == self._pool_hosts:
+            return
+        self._pool_size, self._pool_hosts = pool_size, pool_hosts
+        self.close()
+        if self._aio:
+            self._aio = AsyncTransport(pool_size=pool_size)
+
+    @property
+    def session(self) -> Session:
+        """
+        按需创建会话，关闭后再次使用会自动重建
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = Session()
+                    adapter = HTTPAdapter(pool_connections=self._pool_hosts,
+                                          pool_maxsize=self._pool_size,
+                                          max_retries=0)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    session.headers["Connection"] = "keep-alive"
+                    self._session = session
+        return self._session
+
+    @property
+    def aio(self) -> Optional[AsyncTransport]:
+        """
+        异步发送通道，未启用时为None
+        """
+        return self._aio
+
+    def post(self, url: str, headers: dict = None, data: Any = None,
+             lane: str = None, priority: int = PRIORITY_NORMAL) -> Optional[Response]:
+        """
+        使用共享连接池发送POST请求，启用异步时作为异步通道的同步门面
+        :param lane: 限流通道，为空时不限流
+        :param priority: 发送优先级
+        :raises CircuitOpenError: 熔断期间直接拒绝，不等待请求超时
+        """
+        aio = self._aio
+        if aio and not aio.in_loop():
+            return aio.run(self.apost(url, headers=headers, data=data, lane=lane, priority=priority))
+        self.breaker.check()
+        if lane:
+            self.limiter.acquire(lane, priority)
+        self.concurrency.acquire(priority)
+        start, res = time.monotonic(), None
+        try:
+            res = RequestUtils(headers=headers, session=self.session).post(url, data=data)
+        finally:
+            self.concurrency.release(time.monotonic() - start, ok=self.__ok(res))
+        self.__record(res)
+        return res
+
+    async def apost(self, url: str, headers: dict = None, data: Any = None,
+                    lane: str = None, priority: int = PRIORITY_NORMAL) -> Optional[Any]:
+        """
+        异步POST，需在异步通道的事件循环上运行
+        """
+        self.breaker.check()
+        if lane:
+            await self.limiter.acquire_async(lane, priority)
+        await self.concurrency.acquire_async(priority)
+        start, res = time.monotonic(), None
+        try:
+            res = await self._aio.post(url, headers=headers, data=data)
+        finally:
+            self.concurrency.release(time.monotonic() - start, ok=self.__ok(res))
+        self.__record(res)
+        return res
+
+    def call(self, action: str, params: dict, lane: str = None,
+             priority: int = PRIORITY_NORMAL) -> Optional[dict]:
+        """
+        通过WebSocket长连接发送OneBot动作，未连接或超时返回None
+        :raises CircuitOpenError: 熔断期间直接拒绝
+        """
+        self.breaker.check()
+        if lane:
+            self.limiter.acquire(lane, priority)
+        self.concurrency.acquire(priority)
+        start, res = time.monotonic(), None
+        try:
+            res = self.ws.call(action, params) if self.ws else None
+        finally:
+            self.concurrency.release(time.monotonic() - start, ok=self.__ok_body(res))
+        if res is None:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return res
+
+    def fetch(self, url: str, timeout: float = 15) -> Optional[bytes]:
+        """
+        使用共享连接池下载文件，失败返回None
+        """
+        res = RequestUtils(session=self.session, timeout=timeout).get_res(url)
+        if res is None or res.status_code != 200 or not res.content:
+            return None
+        return res.content
+
+    def image(self, url: str) -> str:
+        """
+        图片地址转换为本地缓存的base64，未启用缓存或下载失败时原样返回
+        """
+        images = self.images
+        if not images or not url:
+            return url
+        return images.get(url) or url
+
+    @classmethod
+    def __ok(cls, res: Optional[Any]) -> bool:
+        """
+        HTTP请求是否正常完成：连接失败、5xx和bot返回的错误码都作为收缩并发的信号
+        """
+        if res is None or res.status_code >= 500:
+            return False
+        try:
+            body = res.json()
+        except Exception:
+            return True
+        return cls.__ok_body(body)
+
+    @staticmethod
+    def __ok_body(body: Optional[Any]) -> bool:
+        """
+        OneBot以retcode为0表示成功，fastapi bot以status为0表示成功
+        """
+        if body is None:
+            return False
+        if not isinstance(body, dict):
+            return True
+        if "retcode" in body:
+            return body.get("retcode") == 0
+        return body.get("status", 0) in (0, "ok")
+
+    def __record(self, res: Optional[Any]):
+        """
+        只有连接失败和5xx说明bot不可用，业务返回码不计入熔断
+        """
+        if res is None or res.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def __probe(self) -> bool:
+        """
+        探测bot是否恢复，能正常响应（非5xx）即视为可用
+        """
+        res = RequestUtils(headers=self._probe_headers, session=self.session, timeout=5).get_res(self._probe_url)
+        return res is not None and res.status_code < 500
+
+    def close(self):
+        """
+        关闭连接池
+        """
+        self.breaker.reset()
+        if self._aio:
+            self._aio.close()
+        with self._lock:
+            session, self._session = self._session, None
+        if session:
+            session.close()
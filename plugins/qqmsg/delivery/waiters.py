@@ -0,0 +1,39 @@
+import asyncio
+from typing import Optional, Set
+
+
+class LoopWaiters:
+    """
+    在事件循环上等待的协程，与threading.Condition配合使用
+    协程持锁登记future后释放锁再await，其它线程持锁通知时通过call_soon_threadsafe唤醒，不占用线程池
+    所有方法都需在持有对应锁时调用
+    """
+
+    def __init__(self):
+        self._futures: Set[asyncio.Future] = set()
+
+    def add(self) -> asyncio.Future:
+        """
+        登记当前事件循环上的一个等待者
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._futures.add(future)
+        return future
+
+    def discard(self, future: Optional[asyncio.Future]):
+        if future is not None:
+            self._futures.discard(future)
+
+    def notify_all(self):
+        futures, self._futures = self._futures, set()
+        for future in futures:
+            try:
+                future.get_loop().call_soon_threadsafe(self.__wake, future)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+    @staticmethod
+    def __wake(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
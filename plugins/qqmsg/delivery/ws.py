@@ -0,0 +1,190 @@
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.log import logger
+
+try:
+    import websocket
+except ImportError:
+    websocket = None
+
+
+class OneBotWebSocket:
+    """
+    OneBot v11 正向WebSocket长连接：发送动作时用echo关联响应，同时接收bot上报的事件
+    """
+
+    def __init__(self, url: str, token: str = None, on_event: Callable[[dict], None] = None,
+                 timeout: float = 10, event_workers: int = 2):
+        """
+        :param url: bot的WebSocket地址，如 ws://127.0.0.1:3001
+        :param token: access_token
+        :param on_event: 事件回调，在独立线程池中执行，不阻塞读取
+        :param timeout: 动作等待响应的超时秒数
+        :param event_workers: 事件处理线程数
+        """
+        self._url = url
+        self._token = token
+        self._on_event = on_event
+        self._timeout = timeout
+        self._event_workers = max(int(event_workers or 0), 1)
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._pending: Dict[str, list] = {}
+        self._pending_lock = threading.Lock()
+        self._echo = itertools.count(1)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._events: Optional[ThreadPoolExecutor] = None
+        self._connected = threading.Event()
+        # bot自身的QQ号，从上报的事件中获取
+        self._self_id = None
+        # 统计
+        self._calls = 0
+        self._timeouts = 0
+        self._received = 0
+        self._reconnects = 0
+
+    @staticmethod
+    def available() -> bool:
+        """
+        是否安装了websocket-client
+        """
+        return websocket is not None
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    @property
+    def self_id(self) -> Optional[Any]:
+        return self._self_id
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._events = ThreadPoolExecutor(max_workers=self._event_workers, thread_name_prefix="qqmsg-ws-event")
+        self._thread = threading.Thread(target=self.__run, name="qqmsg-ws", daemon=True)
+        self._thread.start()
+
+    def call(self, action: str, params: dict, timeout: float = None) -> Optional[dict]:
+        """
+        发送OneBot动作并等待响应，未连接或超时返回None
+        """
+        if not self._connected.wait(timeout or self._timeout):
+            return None
+        echo = str(next(self._echo))
+        waiter = [threading.Event(), None]
+        with self._pending_lock:
+            self._pending[echo] = waiter
+        self._calls += 1
+        try:
+            payload = json.dumps({"action": action, "params": params, "echo": echo}, ensure_ascii=False)
+            with self._send_lock:
+                if not self._conn:
+                    return None
+                self._conn.send(payload)
+            if not waiter[0].wait(timeout or self._timeout):
+                self._timeouts += 1
+                return None
+            return waiter[1]
+        except Exception as err:
+            logger.debug(f"WebSocket发送动作 {action} 失败：{str(err)}")
+            self.__drop()
+            return None
+        finally:
+            with self._pending_lock:
+                self._pending.pop(echo, None)
+
+    def stop(self):
+        self._running = False
+        self.__drop()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+        if self._events:
+            self._events.shutdown(wait=False)
+            self._events = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self._url,
+            "connected": self.connected,
+            "calls": self._calls,
+            "pending": len(self._pending),
+            "timeouts": self._timeouts,
+            "events": self._received,
+            "reconnects": self._reconnects,
+        }
+
+    def __run(self):
+        delay = 1
+        while self._running:
+            try:
+                header = [f"Authorization: Bearer {self._token}"] if self._token else None
+                conn = websocket.create_connection(self._url, header=header, timeout=self._timeout)
+                # 读取阻塞等待事件，不设超时
+                conn.settimeout(None)
+                with self._send_lock:
+                    self._conn = conn
+                self._connected.set()
+                logger.info(f"已连接QQ bot WebSocket：{self._url}")
+                delay = 1
+                self.__read(conn)
+            except Exception as err:
+                if self._running:
+                    logger.warn(f"QQ bot WebSocket连接断开：{str(err)}，{delay}秒后重连")
+            self.__drop()
+            if not self._running:
+                break
+            self._reconnects += 1
+            time.sleep(delay)
+            delay = min(delay * 2, 60)
+
+    def __read(self, conn):
+        while self._running:
+            raw = conn.recv()
+            if not raw:
+                raise ConnectionError("连接已关闭")
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue
+            echo = msg.get("echo")
+            if echo is not None:
+                with self._pending_lock:
+                    waiter = self._pending.get(str(echo))
+                if waiter:
+                    waiter[1] = msg
+                    waiter[0].set()
+                continue
+            if msg.get("self_id"):
+                self._self_id = msg["self_id"]
+            if msg.get("post_type") and self._on_event and self._events:
+                self._received += 1
+                self._events.submit(self.__dispatch, msg)
+
+    def __dispatch(self, event: dict):
+        try:
+            self._on_event(event)
+        except Exception as err:
+            logger.error(f"处理QQ bot事件失败：{str(err)}")
+
+    def __drop(self):
+        self._connected.clear()
+        with self._send_lock:
+            conn, self._conn = self._conn, None
+        if conn:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        # 唤醒所有等待中的调用
+        with self._pending_lock:
+            for waiter in self._pending.values():
+                waiter[0].set()
@@ -0,0 +1,231 @@
+from functools import lru_cache
+from typing import Any, Dict, List, Tuple
+
+from app.schemas.types import NotificationType
+
+# 配置项默认值
+DEFAULTS: Dict[str, Any] = {
+    "enabled": False,
+    'token': '',
+    'msgtypes': [],
+    'queue_size': 1000,
+    'queue_workers': 2,
+    'pool_size': 10,
+    'coalesce_window': 0,
+    'coalesce_max': 20,
+    'rate_limit': 0,
+    'rate_burst': 5,
+    'max_retries': 3,
+    'breaker_threshold': 5,
+    'breaker_timeout': 30,
+    'async_mode': False,
+    'async_inflight': 100,
+    'max_concurrency': 20,
+    'ws_url': '',
+    'page_bytes': 3000,
+    'page_lines': 20,
+    'image_cache': False,
+    'image_cache_size': 100,
+    'image_max_side': 1080,
+    'targets': '',
+    'gzip_min': 0,
+    'reply_cache_ttl': 120,
+    'journal': True
+}
+
+
+def col(component: dict, md: int = None) -> dict:
+    props = {'cols': 12}
+    if md:
+        props['md'] = md
+    return {
+        'component': 'VCol',
+        'props': props,
+        'content': [component]
+    }
+
+
+def row(*cols: dict) -> dict:
+    return {
+        'component': 'VRow',
+        'content': list(cols)
+    }
+
+
+def switch(model: str, label: str, md: int = 6) -> dict:
+    return col({
+        'component': 'VSwitch',
+        'props': {
+            'model': model,
+            'label': label,
+        }
+    }, md)
+
+
+def text_field(model: str, label: str, placeholder: str = '', md: int = 6) -> dict:
+    return col({
+        'component': 'VTextField',
+        'props': {
+            'model': model,
+            'label': label,
+            'placeholder': placeholder,
+        }
+    }, md)
+
+
+def select(model: str, label: str, items: List[dict], md: int = None, multiple: bool = False) -> dict:
+    props = {
+        'model': model,
+        'label': label,
+        'items': items
+    }
+    if multiple:
+        props.update({'multiple': True, 'chips': True})
+    return col({
+        'component': 'VSelect',
+        'props': props
+    }, md)
+
+
+def textarea(model: str, label: str, placeholder: str = '', rows: int = 3) -> dict:
+    return col({
+        'component': 'VTextarea',
+        'props': {
+            'model': model,
+            'label': label,
+            'rows': rows,
+            'placeholder': placeholder
+        }
+    })
+
+
+def alert(text: str, alert_type: str = 'info') -> dict:
+    return col({
+        'component': 'VAlert',
+        'props': {
+            'type': alert_type,
+            'variant': 'tonal',
+            'text': text
+        }
+    })
+
+
+def stat_card(title: str, value: Any, md: int = 2) -> dict:
+    return {
+        'component': 'VCol',
+        'props': {
+            'cols': 6,
+            'md': md
+        },
+        'content': [
+            {
+                'component': 'VCard',
+                'props': {
+                    'variant': 'tonal'
+                },
+                'content': [
+                    {
+                        'component': 'VCardText',
+                        'props': {
+                            'class': 'text-center'
+                        },
+                        'content': [
+                            {
+                                'component': 'div',
+                                'props': {
+                                    'class': 'text-caption'
+                                },
+                                'text': title
+                            },
+                            {
+                                'component': 'div',
+                                'props': {
+                                    'class': 'text-h6'
+                                },
+                                'text': str(value)
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def count_table(title: str, header: List[str], rows: List[list]) -> dict:
+    return row(col({
+        'component': 'VTable',
+        'props': {
+            'hover': True,
+            'density': 'compact'
+        },
+        'content': [
+            {
+                'component': 'thead',
+                'content': [
+                    {
+                        'component': 'tr',
+                        'content': [{'component': 'th', 'text': text} for text in [title, *header]]
+                    }
+                ]
+            },
+            {
+                'component': 'tbody',
+                'content': [
+                    {
+                        'component': 'tr',
+                        'content': [{'component': 'td', 'text': str(value)} for value in values]
+                    } for values in rows
+                ]
+            }
+        ]
+    }))
+
+
+@lru_cache(maxsize=1)
+def form_rows() -> Tuple[dict, ...]:
+    """
+    配置页面的静态部分，每个进程只构建一次，调用方不得修改
+    """
+    # 编历 NotificationType 枚举，生成消息类型选项
+    msg_type_options = [{"title": item.value, "value": item.name} for item in NotificationType]
+    return (
+        row(switch('enabled', '启用插件'),
+            switch('testonce', '测试消息发送')),
+        row(text_field('msg_url', '消息发送地址', 'http://{ip}:{port}', md=4),
+            text_field('ws_url', 'WebSocket地址', 'ws://{ip}:{port}，填写后OneBot走长连接', md=4),
+            select('send_type', '消息发送方式', [
+                {'title': 'Http正向私聊', 'value': 'send_private_msg'},
+                {'title': 'Http正向群聊', 'value': 'send_group_msg'},
+                {'title': 'bot内fastapi', 'value': 'send_fastapi_msg'},
+            ], md=4)),
+        row(text_field('qq_number', '私聊账号/群号', 'qq号/群号'),
+            text_field('token', 'QQ令牌', 'http access_token')),
+        row(text_field('queue_size', '投递队列容量', '1000', md=4),
+            text_field('queue_workers', '投递线程数', '2', md=4),
+            text_field('pool_size', '连接池大小', '10', md=4)),
+        row(text_field('coalesce_window', '消息合并窗口（秒）', '0为不合并'),
+            text_field('coalesce_max', '单条汇总最多合并条数', '20')),
+        row(text_field('rate_limit', '每个目标每分钟最多发送条数', '0为不限制', md=4),
+            text_field('rate_burst', '限流突发条数', '5', md=4),
+            text_field('max_retries', '失败重试次数', '3', md=4)),
+        row(text_field('breaker_threshold', '连续失败熔断次数', '0为不熔断'),
+            text_field('breaker_timeout', '熔断探测间隔（秒）', '30')),
+        row(switch('async_mode', '异步发送（需安装httpx）', md=4),
+            text_field('async_inflight', '异步最大在途请求数', '100', md=4),
+            text_field('max_concurrency', '自适应并发上限', '按bot延迟自动调整，0为不限制', md=4)),
+        row(text_field('page_bytes', '列表每页最大字节数', '3000', md=4),
+            text_field('page_lines', '列表每页最多条数', '20', md=4),
+            text_field('gzip_min', 'fastapi请求体压缩阈值（字节）', '0为不压缩，需bot支持解压请求体', md=4)),
+        row(text_field('reply_cache_ttl', '重复查询回复缓存（秒）', '0为不缓存'),
+            switch('journal', '预写日志（重启后补发未送达的消息）')),
+        row(switch('image_cache', '缓存通知图片', md=4),
+            text_field('image_cache_size', '图片缓存上限（MB）', '100', md=4),
+            text_field('image_max_side', '缩略图最长边（像素，0为不缩放）', '1080', md=4)),
+        row(select('msgtypes', '消息类型', msg_type_options, multiple=True)),
+        row(textarea('targets', '更多发送目标',
+                     '每行一个：发送方式:QQ号或群号[:消息类型,!排除类型[:标题正则]]，'
+                     '如 send_group_msg:123456:Download,Organize:^(?!测试)')),
+        row(alert('消息交互适用send_fastapi_msg方式或填写WebSocket地址（需安装websocket-client）,'
+                  '使用说明https://homev6.anjoy.top/wordpress/2023/12/25/moviepilot/')),
+    )
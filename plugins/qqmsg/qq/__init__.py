@@ -1,22 +1,102 @@
-import json
+from functools import partial
 from typing import Optional, Union, List, Tuple, Any, Dict
 
 from app.core.context import MediaInfo, Context
 from app.core.config import settings
 from app.log import logger
 from app.modules import _ModuleBase, checkMessage
-from app.plugins.qqmsg.qq.qq import QQ
+from app.plugins.qqmsg.delivery import Transport
+from app.plugins.qqmsg.qq.commands import CommandRouter, ResponseCache, normalize
+from app.plugins.qqmsg.qq.dedup import SeenSet
+from app.plugins.qqmsg.qq.inbound import parse_inbound
+from app.plugins.qqmsg.qq.qq import QQ, MORE_KEYWORDS
 from app.schemas import MessageChannel, CommingMessage, Notification
 
 
+# MoviePilot消息链的翻页指令：n下一页，p上一页
+CHAIN_PAGE_KEYWORDS = {"n", "p"}
+
+
 class QQModule(_ModuleBase):
     qq: QQ = None
+    # 已处理的消息，丢弃重复推送
+    _seen: SeenSet = None
+    # 本地命令
+    _commands: CommandRouter = None
+    # 重复查询的回复缓存
+    _responses: ResponseCache = None
 
-    def init_module(self, url, num) -> None:
-        self.qq = QQ(url=url,num=num)
+    def init_module(self, url, num, transport: Transport = None,
+                    page_bytes: int = 3000, page_lines: int = 20, token: str = None, gzip_min: int = 0,
+                    cache_ttl: int = 120) -> None:
+        """
+        初始化模块，重复调用时热更新QQ单例的配置，保留去重记录
+        """
+        self.qq = QQ(url=url, num=num, transport=transport, page_bytes=page_bytes, page_lines=page_lines,
+                     token=token, gzip_min=gzip_min)
+        # 单例已存在时构造参数不生效，显式更新
+        self.qq.configure(url=url, num=num, transport=transport, page_bytes=page_bytes, page_lines=page_lines,
+                          token=token, gzip_min=gzip_min)
+        if self._seen is None:
+            self._seen = SeenSet()
+        if not self._commands:
+            self._commands = CommandRouter()
+            self._commands.add("/status", self.__status, "查看QQ消息投递状态")
+            self._commands.add("/help", lambda: self._commands.help(), "查看可用命令")
+        self._responses = ResponseCache(ttl=cache_ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        入站消息统计
+        """
+        return {
+            "dedup": self._seen.stats() if self._seen is not None else {},
+            "reply_cache": self._responses.stats() if self._responses else {},
+            "sessions": self.qq.sessions() if self.qq else {}
+        }
+
+    def __status(self) -> str:
+        """
+        /status：本地回复投递统计，不经过消息链
+        """
+        transport = self.qq.transport
+        metrics = transport.metrics
+        ws = transport.ws
+        return "\n".join([
+            f"已发送：{metrics.count('sent')}",
+            f"失败：{metrics.count('failed')}",
+            f"重试：{metrics.count('retried')}",
+            f"丢弃：{metrics.count('dropped')}",
+            f"熔断：{transport.breaker.stats().get('state')}",
+            f"WebSocket：{('已连接' if ws.connected else '未连接') if ws else '未启用'}",
+            f"回复缓存命中：{self._responses.hits if self._responses else 0}",
+        ])
+
+    def __cache_key(self, message) -> Optional[tuple]:
+        """
+        消息对应的缓存键：标题查询为（范围, 文本），范围为群或私聊用户；媒体列表上的序号为（范围, 文本, 序号）
+        种子列表上的序号是下载操作，命令和翻页不缓存
+        """
+        text = normalize(message.text)
+        if text.isdigit():
+            view = self._responses.viewing(message.user_id)
+            return view + (text,) if view and len(view) == 2 else None
+        if not text or text.startswith("/") or text in MORE_KEYWORDS or text in CHAIN_PAGE_KEYWORDS:
+            return None
+        scope = f"group:{message.group_id}" if message.group_id else f"private:{message.user_id}"
+        return scope, text
+
+    @staticmethod
+    def __contextual(text: str) -> bool:
+        """
+        序号选择和消息链翻页依赖消息链记录的用户上下文
+        """
+        text = normalize(text)
+        return text.isdigit() or text in CHAIN_PAGE_KEYWORDS
 
     def stop(self):
-        self.qq.stop()
+        if self.qq:
+            self.qq.stop()
 
     def init_setting(self) -> Tuple[str, Union[str, bool]]:
         return "MESSAGER", "telegram"
@@ -50,27 +130,62 @@ class QQModule(_ModuleBase):
         token = args.get("token")
         if not token or token != settings.API_TOKEN:
             return None
+        metrics = self.qq.metrics
         try:
-            message: dict = json.loads(body).get('message')
-            is_qq: dict = json.loads(body).get('is_qq')
-            logger.info(message)
+            # 只解码一次，非QQ消息、非文本消息在记录日志前就被过滤
+            message = parse_inbound(body)
         except Exception as err:
             logger.debug(f"解析QQ消息失败：{str(err)}")
+            metrics.incr("inbound_error")
+            return None
+        if not message:
+            metrics.incr("inbound_ignored")
+            return None
+        # 同一条消息重复推送时直接丢弃，避免重复触发搜索、订阅
+        if self._seen is not None and (message.message_id is not None or message.date is not None) \
+                and self._seen.seen((message.message_id, message.user_id, message.date)):
+            logger.debug(f"丢弃重复的QQ消息：message_id={message.message_id}, userid={message.user_id}")
+            metrics.incr("inbound_duplicate")
+            return None
+        metrics.incr("inbound", target=f"group:{message.group_id}" if message.group_id else "private")
+        logger.info(f"收到QQ消息：userid={message.user_id}, groupid={message.group_id}, "
+                    f"username={message.username}, text={message.text}")
+        # 翻页请求直接由本模块回复，不进入消息链
+        if message.text.strip().lower() in MORE_KEYWORDS \
+                and self.qq.has_more(message.user_id, message.group_id):
+            self.qq.send_next_page(message.user_id, message.group_id)
+            return None
+        # 超出最近列表范围的序号直接提示，范围内的交给消息链按其记录的上下文处理
+        reply = self.qq.check_selection(message.user_id, message.group_id, message.text)
+        if reply is not None:
+            metrics.incr("inbound_local")
+            self.qq.send_msg(title="QQ消息通知", text=reply, userid=message.user_id, groupid=message.group_id)
             return None
-        if not is_qq:
+        # 本地命令直接回复
+        reply = self._commands.handle(message.text) if self._commands else None
+        if reply is not None:
+            metrics.incr("inbound_local")
+            self.qq.send_msg(title="QQ消息通知", text=reply, userid=message.user_id, groupid=message.group_id)
             return None
-        
-        if message:
-            text = message.get("text")
-            user_id = message.get("user_id")
-            group_id = message.get("group_id")
-            # 获取用户名
-            user_name = message.get("username")
-            if text:
-                logger.info(f"收到QQ消息：userid={user_id}, groupid={group_id}, username={user_name}, text={text}")
-                return CommingMessage(channel=MessageChannel.Telegram,
-                                      userid=user_id, groupid=group_id, username=user_name, text=text)
-        return None
+        # 同一群或用户在缓存时间内重复的查询，重放缓存的列表回复
+        text = message.text
+        if self._responses and self._responses.enabled:
+            key = self.__cache_key(message)
+            replay = self._responses.get(message.user_id, key)
+            if replay:
+                metrics.incr("inbound_cached")
+                replay(userid=message.user_id, groupid=message.group_id)
+                return None
+            resync = self._responses.resync(message.user_id) if self.__contextual(text) else None
+            if resync:
+                # 用户正在看的列表是缓存重放的，消息链没有对应的选择上下文，先重新查询该列表
+                key, text = resync
+                self.qq.send_msg(title="QQ消息通知", text="列表已过期，正在重新查询，请在新列表中重新选择",
+                                 userid=message.user_id, groupid=message.group_id)
+            self._responses.expect(message.user_id, key)
+        return CommingMessage(channel=MessageChannel.Telegram,
+                              userid=message.user_id, groupid=message.group_id,
+                              username=message.username, text=text)
 
     @checkMessage(MessageChannel.Telegram)
     def post_message(self, message: Notification) -> None:
@@ -90,8 +205,12 @@ class QQModule(_ModuleBase):
         :param medias: 媒体列表
         :return: 成功或失败
         """
-        return self.qq.send_meidas_msg(title=message.title, medias=medias,
-                                             userid=message.userid, groupid=message.groupid)
+        state = self.qq.send_meidas_msg(title=message.title, medias=medias,
+                                        userid=message.userid, groupid=message.groupid)
+        if state and self._responses:
+            self._responses.put(message.userid, partial(self.qq.send_meidas_msg, title=message.title,
+                                                        medias=medias))
+        return state
 
     @checkMessage(MessageChannel.Telegram)
     def post_torrents_message(self, message: Notification, torrents: List[Context]) -> Optional[bool]:
@@ -101,12 +220,17 @@ class QQModule(_ModuleBase):
         :param torrents: 种子列表
         :return: 成功或失败
         """
-        return self.qq.send_torrents_msg(title=message.title, torrents=torrents, userid=message.userid, groupid=message.groupid)
+        state = self.qq.send_torrents_msg(title=message.title, torrents=torrents,
+                                          userid=message.userid, groupid=message.groupid)
+        if state and self._responses:
+            self._responses.put(message.userid, partial(self.qq.send_torrents_msg, title=message.title,
+                                                        torrents=torrents))
+        return state
 
     def register_commands(self, commands: Dict[str, dict]):
         """
         注册命令，实现这个函数接收系统可用的命令菜单
         :param commands: 命令字典
         """
-        # self.qq.register_commands(commands)
-        pass
+        if self._commands:
+            self._commands.register(commands)
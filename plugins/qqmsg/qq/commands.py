@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").split()).lower()
+
+
+class CommandRouter:
+    """
+    本地命令路由：简单查询直接在QQ模块内回复，不进入MoviePilot消息链
+    """
+
+    def __init__(self):
+        # 本地命令：命令 -> (处理函数, 描述)
+        self._local: Dict[str, Tuple[Callable[[], str], str]] = {}
+        # MoviePilot注册的系统命令：命令 -> 描述
+        self._system: Dict[str, str] = {}
+
+    def add(self, cmd: str, handler: Callable[[], str], description: str = ""):
+        self._local[cmd] = (handler, description)
+
+    def register(self, commands: Dict[str, dict]):
+        """
+        记录系统命令，用于本地帮助
+        """
+        self._system = {cmd: (info or {}).get("description") or "" for cmd, info in (commands or {}).items()}
+
+    def handle(self, text: str) -> Optional[str]:
+        """
+        本地命令返回回复内容，其它消息返回None；与系统命令同名时交给系统处理
+        """
+        cmd = normalize(text)
+        if not cmd.startswith("/") or cmd in self._system:
+            return None
+        local = self._local.get(cmd)
+        return local[0]() if local else None
+
+    def help(self) -> str:
+        lines = [f"{cmd} {description}" for cmd, (_, description) in self._local.items()]
+        lines.extend(f"{cmd} {description}" for cmd, description in self._system.items())
+        return "\n".join(lines)
+
+
+class ResponseCache:
+    """
+    列表回复缓存：同一范围（群或私聊用户）内重复的查询在TTL内直接重放缓存的列表，不再经过消息链重新搜索
+    标题查询按（范围, 规范化文本）缓存媒体列表，媒体列表上的序号按（范围, 文本, 序号）缓存站点搜索得到的种子列表
+    消息链按用户记录选择上下文，重放不会更新它：同时记录每个用户正在查看的列表和消息链最后发给他的列表，
+    两者不一致时由resync给出需要重新交给消息链的查询，避免按旧上下文处理用户的选择
+    """
+
+    def __init__(self, ttl: float = 120, maxsize: int = 256):
+        """
+        :param ttl: 缓存秒数，0为不缓存
+        :param maxsize: 最多缓存的列表数和跟踪的用户数
+        """
+        self._ttl = max(float(ttl or 0), 0)
+        self._maxsize = max(int(maxsize or 0), 1)
+        # 等待消息链回复列表的查询：userid -> 缓存键
+        self._pending: Dict[str, tuple] = {}
+        # 缓存键 -> (过期时间, 重放函数)
+        self._items: "OrderedDict[tuple, Tuple[float, Callable[..., Any]]]" = OrderedDict()
+        # userid -> 正在查看的列表 / 消息链最后发送的列表的缓存键
+        self._views: "OrderedDict[str, Optional[tuple]]" = OrderedDict()
+        self._chain: "OrderedDict[str, Optional[tuple]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._ttl > 0
+
+    def get(self, userid: Any, key: Optional[tuple]) -> Optional[Callable[..., Any]]:
+        """
+        用户每条消息都先调用：命中时返回重放函数（参数为userid、groupid），并记录用户正在查看该列表
+        """
+        if not self._ttl:
+            return None
+        user = str(userid)
+        with self._lock:
+            self._pending.pop(user, None)
+            if key is None:
+                return None
+            entry = self._items.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._items.move_to_end(key)
+                self.__track(self._views, user, key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def viewing(self, userid: Any) -> Optional[tuple]:
+        """
+        用户正在查看的列表的缓存键
+        """
+        with self._lock:
+            return self._views.get(str(userid))
+
+    def resync(self, userid: Any) -> Optional[Tuple[tuple, str]]:
+        """
+        用户正在查看的列表来自缓存、消息链的上下文不是该列表时，返回需要重新交给消息链的(缓存键, 查询文本)；
+        种子列表在消息链停留在其媒体列表时只需重发序号，否则从标题重新查询
+        """
+        user = str(userid)
+        with self._lock:
+            view, chain = self._views.get(user), self._chain.get(user)
+        if view is None or view == chain:
+            return None
+        if len(view) > 2 and chain == view[:-1]:
+            return view, view[-1]
+        return view[:2], view[1]
+
+    def expect(self, userid: Any, key: Optional[tuple]):
+        """
+        记录交给消息链处理的查询，消息链回复列表时与之关联
+        """
+        if not self._ttl or key is None:
+            return
+        with self._lock:
+            self._pending[str(userid)] = key
+            while len(self._pending) > self._maxsize:
+                self._pending.pop(next(iter(self._pending)))
+
+    def put(self, userid: Any, replay: Callable[..., Any]):
+        """
+        消息链向用户回复了列表：缓存对应查询的重放函数，用户的查看列表和消息链上下文同步为该列表
+        没有对应查询时（如消息链自己的翻页）记为未知列表，之后的选择直接交给消息链
+        """
+        if not self._ttl:
+            return
+        user = str(userid)
+        with self._lock:
+            key = self._pending.pop(user, None)
+            self.__track(self._views, user, key)
+            self.__track(self._chain, user, key)
+            if key is None:
+                return
+            self._items[key] = (time.monotonic() + self._ttl, replay)
+            self._items.move_to_end(key)
+            while len(self._items) > self._maxsize:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ttl": self._ttl,
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def __track(self, table: "OrderedDict[str, Optional[tuple]]", user: str, key: Optional[tuple]):
+        table[user] = key
+        table.move_to_end(user)
+        while len(table) > self._maxsize:
+            table.popitem(last=False)
@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+class SeenSet:
+    """
+    有界、按TTL淘汰的已处理消息集合，用于丢弃bot重连重推或代理重试造成的重复消息
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 600):
+        """
+        :param maxsize: 最多记录的消息数，超出时淘汰最早的
+        :param ttl: 记录保留秒数
+        """
+        self._maxsize = max(int(maxsize or 0), 1)
+        self._ttl = max(float(ttl or 0), 1)
+        self._items: "OrderedDict[Hashable, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def seen(self, key: Hashable) -> bool:
+        """
+        判断消息是否处理过，未处理过则记录下来
+        """
+        now = time.monotonic()
+        with self._lock:
+            # 插入顺序即过期顺序，从头部淘汰已过期的记录
+            while self._items:
+                if next(iter(self._items.values())) > now:
+                    break
+                self._items.popitem(last=False)
+            if key in self._items:
+                self.hits += 1
+                return True
+            if len(self._items) >= self._maxsize:
+                self._items.popitem(last=False)
+            self._items[key] = now + self._ttl
+            self.misses += 1
+            return False
+
+    def __len__(self):
+        return len(self._items)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
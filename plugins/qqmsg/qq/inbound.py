@@ -0,0 +1,51 @@
+import json
+from typing import Any, Optional
+
+try:
+    import orjson
+
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+
+class InboundMessage:
+    """
+    bot推送过来的一条QQ文本消息
+    """
+    __slots__ = ("message_id", "user_id", "group_id", "username", "date", "text")
+
+    def __init__(self, message_id: Any, user_id: Any, group_id: Any, username: Optional[str],
+                 date: Any, text: str):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.group_id = group_id
+        self.username = username
+        self.date = date
+        self.text = text
+
+    def __repr__(self):
+        return f"InboundMessage(userid={self.user_id}, groupid={self.group_id}, " \
+               f"username={self.username}, text={self.text})"
+
+
+def parse_inbound(body: Any) -> Optional[InboundMessage]:
+    """
+    只解码一次请求体，非QQ消息、非文本消息直接返回None
+    :raises ValueError: 请求体不是合法JSON
+    """
+    data = body if isinstance(body, dict) else loads(body)
+    if not isinstance(data, dict) or not data.get("is_qq"):
+        return None
+    message = data.get("message")
+    if not isinstance(message, dict):
+        return None
+    text = message.get("text")
+    if not text or not isinstance(text, str):
+        return None
+    return InboundMessage(message_id=message.get("message_id"),
+                          user_id=message.get("user_id"),
+                          group_id=message.get("group_id"),
+                          username=message.get("username"),
+                          date=message.get("date"),
+                          text=text)
@@ -1,61 +1,149 @@
-import re,json
-import threading
-from pathlib import Path
+import time
 from threading import Event
-from typing import Optional, List, Dict
-from urllib.parse import urlencode
+from typing import Optional, List, Dict, Iterable, Tuple
 
-from app.core.config import settings
 from app.core.context import MediaInfo, Context
-from app.core.metainfo import MetaInfo
 from app.log import logger
-from app.utils.common import retry
-from app.utils.http import RequestUtils
+from app.plugins.qqmsg.delivery import Transport, PRIORITY_INTERACTIVE, CircuitOpenError, Metrics, \
+    PayloadBuilder, MessageBuilder, forward_nodes, lane_of
+from app.plugins.qqmsg.qq.render import media_lines, paginate, torrent_lines
+from app.plugins.qqmsg.qq.session import Session, SessionStore
 from app.utils.singleton import Singleton
-from app.utils.string import StringUtils
 
 # apihelper.proxy = settings.PROXY
 
+# 查看下一页的回复关键字
+MORE_KEYWORDS = {"更多", "下一页", "more"}
+# 最多保留多少个用户的列表会话
+MAX_SESSIONS = 256
+# 列表会话保留秒数
+SESSION_TTL = 600
+# OneBot v11 表示动作不存在（bot不支持）的retcode
+RETCODE_UNSUPPORTED = 1404
+# bot不支持动作时错误信息中的关键字
+UNSUPPORTED_WORDINGS = ("unsupported", "unknown action", "not supported", "不支持", "未知")
+
 
 class QQ(metaclass=Singleton):
     _ds_url = None
     _qq_number = None
     _event = Event()
+    _transport: Transport = None
+    # 连接池是否由自身创建
+    _own_transport = False
+    # 每页最大字节数
+    _page_bytes = 3000
+    # 每页最大条数
+    _page_lines = 20
+    # bot的access_token
+    _token = None
+    # 预先算好的请求模板
+    _payload: PayloadBuilder = None
+    # bot是否支持合并转发消息，不支持时列表改为分页发送
+    _forward = True
 
-    def __init__(self, num, url: str = None):
+    def __init__(self, num, url: str = None, transport: Transport = None,
+                 page_bytes: int = 3000, page_lines: int = 20, token: str = None, gzip_min: int = 0):
         """
         初始化参数
         """
+        # 每个用户最近一次收到的列表和翻页位置：(userid, groupid) -> Session
+        self._sessions = SessionStore(ttl=SESSION_TTL, maxsize=MAX_SESSIONS)
+        self.configure(num=num, url=url, transport=transport,
+                       page_bytes=page_bytes, page_lines=page_lines, token=token, gzip_min=gzip_min)
+
+    def configure(self, num, url: str = None, transport: Transport = None,
+                  page_bytes: int = 3000, page_lines: int = 20, token: str = None, gzip_min: int = 0):
+        """
+        更新配置，单例在插件配置变化时直接热更新，不重新创建
+        """
         self._ds_url = url
         self._qq_number = num
+        self._token = token
+        # 优先复用插件的连接池，未提供时自建（已自建的继续使用）
+        if transport is None:
+            if not self._own_transport or not self._transport:
+                self._transport = Transport()
+                self._own_transport = True
+        elif transport is not self._transport:
+            if self._own_transport and self._transport:
+                self._transport.close()
+            self._transport = transport
+            self._own_transport = False
+        self._page_bytes = max(int(page_bytes or 0), 200)
+        self._page_lines = max(int(page_lines or 0), 1)
+        self._payload = PayloadBuilder(url=url, send_type="send_fastapi_msg", number=num,
+                                       token=token, gzip_min=gzip_min)
+        self._forward = True
+
+    @property
+    def transport(self) -> Transport:
+        return self._transport
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._transport.metrics
 
-    def __send_request(self, userid: str = None, image="", caption="",title= "") -> bool:
-        headers = {'content-type': 'application/json'}
-        message_url = self._ds_url
-        req_json = {
-            "user_id": self._qq_number,
-            "group_id": self._qq_number,
-        }
-        
-        data = {
-            "user": userid,
-            "title": title,
-            "image": image,
-            "text": caption
-        }
-        if ret := RequestUtils(headers=headers).post(message_url,
-                                                     data=json.dumps({**req_json, **data}, ensure_ascii=False).encode('utf-8')):
+    def __send_request(self, userid: str = None, image="", caption="",title= "", groupid: str = None) -> bool:
+        """
+        发送一条交互回复并记录耗时和结果
+        """
+        start = time.monotonic()
+        state = self.__do_send_request(userid=userid, image=image, caption=caption, title=title, groupid=groupid)
+        metrics = self._transport.metrics
+        metrics.observe("reply", time.monotonic() - start)
+        metrics.incr("sent" if state else "failed", mtype="Reply",
+                     target=f"group:{groupid}" if groupid else f"private:{userid}")
+        return state
+
+    def __do_send_request(self, userid: str = None, image="", caption="", title="", groupid: str = None) -> bool:
+        # 启用图片缓存时发送本地缓存的缩略图，避免bot重复下载同一海报
+        image = self._transport.image(image)
+        # 交互回复优先于批量通知发送：与同一目标的通知使用相同的限流通道，才能在通道内按优先级排到前面
+        if self._transport.ws:
+            lane = lane_of("send_group_msg", groupid) if groupid else lane_of("send_private_msg", userid)
+            return self.__send_ws(userid=userid, groupid=groupid, image=image, caption=caption, lane=lane)
+        # fastapi方式所有消息都经同一个bot账号发送，与该账号的通知同一通道
+        payload = self._payload
+        lane = lane_of(payload.send_type, payload.number)
+        headers, data = payload.fastapi_body(user=userid, title=title, image=image, text=caption)
+        try:
+            ret = self._transport.post(payload.url, headers=headers, data=data,
+                                       lane=lane, priority=PRIORITY_INTERACTIVE)
+        except CircuitOpenError as err:
+            logger.warn(str(err))
+            return False
+        if ret:
             logger.info(f"发送消息结果：[{ret.status_code}]")
 
         return True if ret and ret.status_code == 200 else False
     
-    def send_msg(self, title: str, text: str = "", image: str = "", userid: str = "") -> Optional[bool]:
+    def __send_ws(self, userid: str = None, groupid: str = None, image="", caption="", lane: str = None) -> bool:
+        """
+        通过WebSocket长连接直接回复到来源私聊或群
+        """
+        message = MessageBuilder().image(image).markdown(caption).build()
+        if groupid:
+            action, params = "send_group_msg", {"group_id": groupid, "message": message}
+        else:
+            action, params = "send_private_msg", {"user_id": userid, "message": message}
+        try:
+            ret = self._transport.call(action, params, lane=lane, priority=PRIORITY_INTERACTIVE)
+        except CircuitOpenError as err:
+            logger.warn(str(err))
+            return False
+        logger.info(f"发送消息结果：[{ret.get('retcode') if ret else '超时'}]")
+        return bool(ret) and ret.get("retcode") == 0
+
+    def send_msg(self, title: str, text: str = "", image: str = "", userid: str = "",
+                 groupid: str = "") -> Optional[bool]:
         """
         发送QQ消息
         :param title: 消息标题
         :param text: 消息内容
         :param image: 消息图片地址
         :param userid: 用户ID，如有则只发消息给该用户
+        :param groupid: 群ID，消息来自群聊时回复到该群
         :userid: 发送消息的目标用户ID，为空则发给管理员
         """
         if not title and not text:
@@ -73,48 +161,33 @@ class QQ(metaclass=Singleton):
             else:
                 chat_id = self._qq_number
 
-            return self.__send_request(userid=chat_id, image=image, caption=caption,title=title)
+            return self.__send_request(userid=chat_id, image=image, caption=caption, title=title,
+                                       groupid=groupid)
 
         except Exception as msg_e:
             logger.error(f"发送消息失败：{msg_e}")
             return False
 
-    def send_meidas_msg(self, medias: List[MediaInfo], userid: str = "", title: str = "") -> Optional[bool]:
+    def send_meidas_msg(self, medias: List[MediaInfo], userid: str = "", title: str = "",
+                        groupid: str = "") -> Optional[bool]:
         """
         发送媒体列表消息
         """
         try:
-            index, image, caption = 1, "", "*%s*" % title
-            for media in medias:
-                if not image:
-                    image = media.get_message_image()
-                if media.vote_average:
-                    caption = "%s\n%s. [%s](%s)\n_%s，%s_" % (caption,
-                                                             index,
-                                                             media.title_year,
-                                                             media.detail_link,
-                                                             f"类型：{media.type.value}",
-                                                             f"评分：{media.vote_average}")
-                else:
-                    caption = "%s\n%s. [%s](%s)\n_%s_" % (caption,
-                                                          index,
-                                                          media.title_year,
-                                                          media.detail_link,
-                                                          f"类型：{media.type.value}")
-                index += 1
-
+            image = next((img for img in (media.get_message_image() for media in medias) if img), "")
             if userid:
                 chat_id = userid
             else:
                 chat_id = self._qq_number
-            return self.__send_request(userid=chat_id, image=image, caption=caption,title=title)
+            return self.__send_list(items=medias, header="*%s*" % title, lines=media_lines(medias),
+                                    userid=chat_id, groupid=groupid, image=image, title=title)
 
         except Exception as msg_e:
             logger.error(f"发送消息失败：{msg_e}")
             return False
 
     def send_torrents_msg(self, torrents: List[Context],
-                          userid: str = "", title: str = "") -> Optional[bool]:
+                          userid: str = "", title: str = "", groupid: str = "") -> Optional[bool]:
         """
         发送列表消息
         """
@@ -122,39 +195,131 @@ class QQ(metaclass=Singleton):
             return False
 
         try:
-            index, caption = 1, "*%s*" % title
             mediainfo = torrents[0].media_info
-            for context in torrents:
-                torrent = context.torrent_info
-                site_name = torrent.site_name
-                meta = MetaInfo(torrent.title, torrent.description)
-                link = torrent.page_url
-                title = f"{meta.season_episode} " \
-                        f"{meta.resource_term} " \
-                        f"{meta.video_term} " \
-                        f"{meta.release_group}"
-                title = re.sub(r"\s+", " ", title).strip()
-                free = torrent.volume_factor
-                seeder = f"{torrent.seeders}↑"
-                caption = f"{caption}\n{index}.【{site_name}】[{title}]({link}) " \
-                          f"{StringUtils.str_filesize(torrent.size)} {free} {seeder}"
-                index += 1
-
             if userid:
                 chat_id = userid
             else:
                 chat_id = self._qq_number
-
-            return self.__send_request(userid=chat_id, caption=caption,
-                                       image=mediainfo.get_message_image(),title=title)
+            return self.__send_list(items=torrents, header="*%s*" % title, lines=torrent_lines(torrents),
+                                    userid=chat_id, groupid=groupid,
+                                    image=mediainfo.get_message_image(), title=title)
 
         except Exception as msg_e:
             logger.error(f"发送消息失败：{msg_e}")
             return False
 
 
+    @staticmethod
+    def __session_key(userid: str, groupid: str = None) -> Tuple[str, str]:
+        return str(userid), str(groupid or "")
+
+    def has_more(self, userid: str, groupid: str = None) -> bool:
+        """
+        该用户是否有未发送的分页
+        """
+        session = self._sessions.get(self.__session_key(userid, groupid))
+        return bool(session and session.more)
+
+    def send_next_page(self, userid: str, groupid: str = None) -> bool:
+        """
+        发送该用户的下一页列表
+        """
+        with self._sessions.lock:
+            session = self._sessions.get(self.__session_key(userid, groupid))
+            caption = session.next_page() if session else None
+        if caption is None:
+            return False
+        return self.__send_caption(session, caption, userid=userid, groupid=groupid)
+
+    def check_selection(self, userid: str, groupid: str = None, text: str = "") -> Optional[str]:
+        """
+        用户回复序号时检查是否超出最近一次列表的条数，超出返回提示，其它情况返回None交给消息链
+        0为种子列表的自动选择，同样交给消息链
+        """
+        text = (text or "").strip()
+        if not text.isdigit():
+            return None
+        session = self._sessions.get(self.__session_key(userid, groupid))
+        if not session or int(text) <= len(session.items):
+            return None
+        return f"序号超出范围，请输入1-{len(session.items)}之间的序号"
+
+    def sessions(self) -> Dict[str, int]:
+        return self._sessions.stats()
+
+    def __send_list(self, items: list, header: str, lines: Iterable[str], userid: str, groupid: str = None,
+                    image: str = "", title: str = "") -> bool:
+        """
+        记录列表会话并发送列表：WebSocket连接时整个列表作为一条合并转发消息发送，
+        bot不支持合并转发或走fastapi时只渲染发送第一页，剩余分页留给用户回复“更多”时再发送
+        """
+        if self._transport.ws and self._forward:
+            lines = list(lines)
+            state = self.__send_forward(header=header, lines=lines, image=image, userid=userid, groupid=groupid)
+            if state is not None:
+                if state:
+                    session = Session(title=title, image=image, items=items, pages=iter(()))
+                    session.more = False
+                    self._sessions.put(self.__session_key(userid, groupid), session)
+                return state
+        pages = paginate(header, lines, max_bytes=self._page_bytes, max_lines=self._page_lines)
+        session = Session(title=title, image=image, items=items, pages=pages)
+        with self._sessions.lock:
+            caption = session.next_page()
+            self._sessions.put(self.__session_key(userid, groupid), session)
+        return self.__send_caption(session, caption, userid=userid, groupid=groupid)
+
+    def __send_forward(self, header: str, lines: List[str], image: str = "", userid: str = None,
+                       groupid: str = None) -> Optional[bool]:
+        """
+        通过WebSocket发送合并转发消息，一次请求发送整个列表；bot不支持时返回None改为分页发送
+        """
+        start = time.monotonic()
+        image = self._transport.image(image)
+        nodes = forward_nodes(header=header, lines=lines, image=image,
+                              uin=self._transport.ws.self_id or userid)
+        if groupid:
+            action, params = "send_group_forward_msg", {"group_id": groupid, "messages": nodes}
+        else:
+            action, params = "send_private_forward_msg", {"user_id": userid, "messages": nodes}
+        lane = lane_of("send_group_msg", groupid) if groupid else lane_of("send_private_msg", userid)
+        try:
+            ret = self._transport.call(action, params, lane=lane, priority=PRIORITY_INTERACTIVE)
+        except CircuitOpenError as err:
+            logger.warn(str(err))
+            return False
+        logger.info(f"发送合并转发消息结果：[{ret.get('retcode') if ret else '超时'}]")
+        if ret and ret.get("retcode") != 0 and self.__unsupported(ret):
+            logger.warn(f"bot不支持合并转发消息：{ret.get('wording') or ret.get('msg') or ret.get('status')}，改为分页发送")
+            self._forward = False
+            return None
+        # 其它失败（限流、bot临时错误）按普通发送失败处理，之后仍使用合并转发
+        state = bool(ret) and ret.get("retcode") == 0
+        metrics = self._transport.metrics
+        metrics.observe("reply", time.monotonic() - start)
+        metrics.incr("sent" if state else "failed", mtype="Reply", target=lane)
+        return state
+
+    @staticmethod
+    def __unsupported(ret: dict) -> bool:
+        """
+        bot返回动作不存在或不支持
+        """
+        if ret.get("retcode") == RETCODE_UNSUPPORTED:
+            return True
+        wording = f"{ret.get('wording') or ''} {ret.get('msg') or ''}".lower()
+        return any(word in wording for word in UNSUPPORTED_WORDINGS)
+
+    def __send_caption(self, session: Session, caption: str, userid: str, groupid: str = None) -> bool:
+        if session.more:
+            caption = f"{caption}\n回复“更多”查看下一页"
+        return self.__send_request(userid=userid, image=session.image, caption=caption, title=session.title,
+                                   groupid=groupid)
+
     def stop(self):
         """
         停止qq消息接收服务
         """
-        pass
+        self._sessions.clear()
+        if self._own_transport and self._transport:
+            self._transport.close()
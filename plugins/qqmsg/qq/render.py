@@ -0,0 +1,75 @@
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Tuple
+
+from app.core.context import MediaInfo, Context
+from app.core.metainfo import MetaInfo
+from app.utils.string import StringUtils
+
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def torrent_label(title: str, description: str = "") -> str:
+    """
+    种子标题识别后的简要描述（季集、资源类型、视频编码、制作组），同一种子重复展示时直接命中缓存
+    """
+    meta = MetaInfo(title, description)
+    label = f"{meta.season_episode} " \
+            f"{meta.resource_term} " \
+            f"{meta.video_term} " \
+            f"{meta.release_group}"
+    return _SPACES.sub(" ", label).strip()
+
+
+def torrent_line(index: int, context: Context) -> str:
+    torrent = context.torrent_info
+    return f"{index}.【{torrent.site_name}】" \
+           f"[{torrent_label(torrent.title, torrent.description or '')}]({torrent.page_url}) " \
+           f"{StringUtils.str_filesize(torrent.size)} {torrent.volume_factor} {torrent.seeders}↑"
+
+
+def media_line(index: int, media: MediaInfo) -> str:
+    if media.vote_average:
+        return "%s. [%s](%s)\n_%s，%s_" % (index,
+                                          media.title_year,
+                                          media.detail_link,
+                                          f"类型：{media.type.value}",
+                                          f"评分：{media.vote_average}")
+    return "%s. [%s](%s)\n_%s_" % (index,
+                                   media.title_year,
+                                   media.detail_link,
+                                   f"类型：{media.type.value}")
+
+
+def torrent_lines(torrents: List[Context]) -> Iterator[str]:
+    """
+    按需逐条渲染种子，分页时只渲染实际发送的部分
+    """
+    return (torrent_line(index, context) for index, context in enumerate(torrents, start=1))
+
+
+def media_lines(medias: List[MediaInfo]) -> Iterator[str]:
+    return (media_line(index, media) for index, media in enumerate(medias, start=1))
+
+
+def paginate(header: str, lines: Iterable[str], max_bytes: int = 3000,
+             max_lines: int = 20) -> Iterator[Tuple[str, bool]]:
+    """
+    将列表切分为不超过字节数和行数预算的消息页，惰性生成
+    :param header: 每页的标题行
+    :param lines: 列表行，可以是生成器
+    :param max_bytes: 每页最大字节数（UTF-8）
+    :param max_lines: 每页最大行数（不含标题）
+    :return: (页面文本, 是否还有下一页)
+    """
+    header_bytes = len(header.encode("utf-8")) + 1
+    page, size = [], header_bytes
+    for line in lines:
+        line_bytes = len(line.encode("utf-8")) + 1
+        if page and (len(page) >= max_lines or size + line_bytes > max_bytes):
+            yield "\n".join([header, *page]), True
+            page, size = [], header_bytes
+        page.append(line)
+        size += line_bytes
+    yield "\n".join([header, *page]), False
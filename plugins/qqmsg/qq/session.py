@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+
+
+class Session:
+    """
+    一个用户（私聊或群内）最近一次收到的列表及翻页位置
+    """
+    __slots__ = ("title", "image", "items", "pages", "cursor", "more", "expires")
+
+    def __init__(self, title: str, image: str, items: List[Any], pages: Iterator[Tuple[str, bool]]):
+        """
+        :param title: 列表标题
+        :param image: 列表图片
+        :param items: 列表条目（媒体或种子），用于判断序号是否有效
+        :param pages: 分页生成器
+        """
+        self.title = title
+        self.image = image
+        self.items = items
+        self.pages = pages
+        # 已发送的页数
+        self.cursor = 0
+        # 是否还有下一页
+        self.more = True
+        self.expires = 0.0
+
+    def next_page(self) -> Optional[str]:
+        """
+        取下一页文本，没有更多页时返回None
+        """
+        if not self.more:
+            return None
+        caption, self.more = next(self.pages, ("", False))
+        self.cursor += 1
+        return caption
+
+
+class SessionStore:
+    """
+    按(userid, groupid)保存的有界会话，按TTL和条目总数淘汰最久未使用的会话
+    """
+
+    def __init__(self, ttl: float = 600, maxsize: int = 256, max_items: int = 20000):
+        """
+        :param ttl: 会话保留秒数
+        :param maxsize: 最多保留的会话数
+        :param max_items: 所有会话的列表条目总数上限
+        """
+        self._ttl = max(float(ttl or 0), 1)
+        self._maxsize = max(int(maxsize or 0), 1)
+        self._max_items = max(int(max_items or 0), 1)
+        self._sessions: "OrderedDict[Hashable, Session]" = OrderedDict()
+        self._items = 0
+        self._lock = threading.RLock()
+
+    @property
+    def lock(self) -> threading.RLock:
+        """
+        翻页时持有，避免同一会话被并发推进
+        """
+        return self._lock
+
+    def get(self, key: Hashable) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return None
+            if session.expires <= time.monotonic():
+                self.__remove(key)
+                return None
+            session.expires = time.monotonic() + self._ttl
+            self._sessions.move_to_end(key)
+            return session
+
+    def put(self, key: Hashable, session: Session):
+        with self._lock:
+            self.__remove(key)
+            session.expires = time.monotonic() + self._ttl
+            self._sessions[key] = session
+            self._items += len(session.items)
+            self.__evict()
+
+    def pop(self, key: Hashable) -> Optional[Session]:
+        with self._lock:
+            return self.__remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._items = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "items": self._items,
+        }
+
+    def __remove(self, key: Hashable) -> Optional[Session]:
+        session = self._sessions.pop(key, None)
+        if session:
+            self._items -= len(session.items)
+        return session
+
+    def __evict(self):
+        now = time.monotonic()
+        # 访问时会续期并移到末尾，头部即最早过期的；先淘汰过期的，再淘汰超出数量和条目上限的，至少保留最新的一个
+        while self._sessions and next(iter(self._sessions.values())).expires <= now:
+            self.__remove(next(iter(self._sessions)))
+        while len(self._sessions) > 1 and (len(self._sessions) > self._maxsize or self._items > self._max_items):
+            self.__remove(next(iter(self._sessions)))